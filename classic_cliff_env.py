@@ -2,6 +2,7 @@ from karelcraft.karelcraft import *
 import os
 import pathlib
 import numpy as np
+from karelcraft.rl.metrics import TrainingMetrics
 
 # MODE = 'learn'
 MODE = 'play'
@@ -62,6 +63,7 @@ class CliffEnv:
     def set_model_path(self) -> None:
         self.model_dir = os.path.join('training', 'model')
         pathlib.Path(self.model_dir).mkdir(parents=True, exist_ok=True)
+        self.metrics_path = os.path.join('training', 'logs', 'cliff_metrics.csv')
 
     def vec2id(self, position):
         '''
@@ -112,6 +114,12 @@ class CliffEnv:
         '''
         return self.rewards[point[0], point[1]] != -1.
 
+    def get_start_location(self) -> tuple:
+        '''
+        Karel always starts at the bottom-left, next to the cliff
+        '''
+        return (self.rows - 1, 0)
+
     @staticmethod
     def numpy2world(point, num_rows) -> tuple:
         '''
@@ -138,10 +146,13 @@ class CliffEnv:
         else:
             return np.argmax(self.q_values[state])
 
-    def learn(self, mode='sarsa', num_episodes=1000, epsilon=0.9, discount_factor=0.8, learning_rate=0.2, exploration_rate=0.1):
+    def learn(self, mode='sarsa', num_episodes=1000, epsilon=0.9, discount_factor=0.8, learning_rate=0.2, exploration_rate=0.1,
+              min_delta_q=None, metrics=None):
         # Training Sarsa
+        metrics = metrics or TrainingMetrics(self.metrics_path, min_delta_q=min_delta_q)
         for i in range(num_episodes):
-            prompt(f'Train episode: {i}')
+            if self.render:
+                prompt(f'Train episode: {i}')
             self.agent_position = (3, 0)  # bottom-left
             if self.render:
                 world_start_pt = reset()
@@ -169,6 +180,7 @@ class CliffEnv:
                     td_error = td_target - self.q_values[state][action]
 
                     self.q_values[state][action] += learning_rate * td_error  # new q value
+                    metrics.step(reward, learning_rate * td_error)
 
                     # Update state
                     state = next_state
@@ -178,10 +190,16 @@ class CliffEnv:
                     td_target = reward + discount_factor * np.max(self.q_values[next_state])
                     td_error = td_target - self.q_values[state][action]
                     self.q_values[state][action] += learning_rate * td_error
+                    metrics.step(reward, learning_rate * td_error)
                     # Update state
                     state = next_state
 
-        print(self.q_values)
+            if metrics.end_episode(i, exploration_rate):
+                print(f'Converged after {i + 1} episodes')
+                break
+
+        metrics.close()
+        print(metrics.summary())
         np.save(self.model_dir + '/cliff_q_values.npy', self.q_values)
         prompt('Training complete!')
 
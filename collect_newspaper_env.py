@@ -8,6 +8,7 @@ from karelcraft.karelcraft import *
 import os
 from pathlib import Path
 import numpy as np
+from karelcraft.rl.metrics import TrainingMetrics
 
 # MODE = 'learn'
 MODE = 'play'
@@ -73,6 +74,7 @@ class CollectNewspaperEnv:
         self.model_dir = os.path.join('training', 'model')
         Path(self.model_dir).mkdir(parents=True, exist_ok=True)
         self.model_path = os.path.join(self.model_dir, Path(__file__).stem + '_q_values.npy')
+        self.metrics_path = os.path.join('training', 'logs', Path(__file__).stem + '_metrics.csv')
 
     def step(self, action_idx):
         '''
@@ -137,6 +139,12 @@ class CollectNewspaperEnv:
         '''
         return self.rewards[point[0], point[1]] != -1.
 
+    def get_start_location(self):
+        '''
+        Karel always starts inside the house
+        '''
+        return (1, 2)
+
     def get_next_action(self, point, epsilon):
         '''
         epsilon greedy algorithm that will choose which action to take next
@@ -146,14 +154,18 @@ class CollectNewspaperEnv:
         else:
             return np.random.randint(4)  # choose a random action
 
-    def learn(self, num_episodes=500, epsilon=0.9, discount_factor=0.9, learning_rate=0.9):
+    def learn(self, num_episodes=500, epsilon=0.9, discount_factor=0.9, learning_rate=0.9,
+              min_delta_q=None, metrics=None):
         '''
         epsilon - percent of time to take the best action (instead of a random)
         discount_factor  - discount factor for future rewards
         learning_rate - the rate at which the AI agent should learn
+        min_delta_q - stop early once max |dQ| per episode stays below this
         '''
+        metrics = metrics or TrainingMetrics(self.metrics_path, min_delta_q=min_delta_q)
         for i in range(num_episodes):
-            prompt(f'Train episode: {i}')
+            if self.render:
+                prompt(f'Train episode: {i}')
             self.agent_position = (1, 2)
             observation = self.agent_position
             if self.render:
@@ -175,8 +187,14 @@ class CollectNewspaperEnv:
                 # update the Q-value for the previous state and action pair
                 new_q_value = old_q_value + (learning_rate * temporal_diff)  # Bellman
                 self.q_values[old_state[0], old_state[1], action_idx] = new_q_value
+                metrics.step(reward, new_q_value - old_q_value)
+
+            if metrics.end_episode(i, epsilon):
+                print(f'Converged after {i + 1} episodes')
+                break
 
-        print(self.q_values)
+        metrics.close()
+        print(metrics.summary())
 
         # self.model_path = self.model_dir + '/' + Path(__file__).stem + '_q_values.npy'
         # self.model_path = os.path.join(self.model_dir, Path(__file__).stem + '_q_values.npy')
@@ -0,0 +1,121 @@
+"""
+Warm-start daemon support: one KarelCraft window is kept open and later
+runs of student programs are handed over to it instead of starting a new
+App, e.g.
+
+    export KARELCRAFT_DAEMON=1      # or a socket path
+    python collect_newspaper_karel.py   # first run opens the window
+    python collect_newspaper_karel.py   # later runs reuse it
+
+Requests are one JSON line {"code_file": ..., "world_file": ...} over a
+Unix domain socket, answered by one JSON line {"status": ..., "message": ...}.
+This module must not import ursina, clients only need the socket side.
+"""
+import json
+import os
+import socket
+import tempfile
+from pathlib import Path
+
+from karelcraft.utils.world_loader import WorldLoader
+
+DAEMON_ENV = 'KARELCRAFT_DAEMON'
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'karelcraft.sock')
+TIMEOUT = 10.
+
+
+def daemon_socket() -> str:
+    '''
+    Socket path from $KARELCRAFT_DAEMON, None if the daemon is disabled
+    '''
+    value = os.environ.get(DAEMON_ENV, '')
+    if value in ('', '0'):
+        return None
+    return DEFAULT_SOCKET if value == '1' else value
+
+
+def resolve_world(world_file: str) -> str:
+    '''
+    Absolute world path without suffix, so client and daemon agree on it
+    '''
+    if not world_file:
+        return ''
+    return str(WorldLoader(world_file).world_file.resolve().with_suffix(''))
+
+
+def read_line(conn) -> dict:
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return json.loads(data) if data else {}
+
+
+def send_line(conn, message: dict) -> None:
+    conn.sendall(json.dumps(message).encode() + b'\n')
+
+
+def submit(socket_path: str, code_file: Path, world_file: str) -> bool:
+    '''
+    Hands a program over to a running daemon.
+    Returns False if no daemon is listening on socket_path.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+        conn.settimeout(TIMEOUT)
+        send_line(conn, {'code_file': str(Path(code_file).resolve()),
+                         'world_file': resolve_world(world_file)})
+        reply = read_line(conn)
+    print(f"KarelCraft daemon: {reply.get('message', 'no reply')}")
+    return True
+
+
+class AppServer:
+    '''
+    Non-blocking listener polled by the App once per frame
+    '''
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):  # stale socket of a closed daemon
+            os.unlink(socket_path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(socket_path)
+        self.sock.listen(4)
+        self.sock.setblocking(False)
+
+    def poll(self) -> tuple:
+        '''
+        Returns (connection, request) of a waiting client, or None
+        '''
+        try:
+            conn, _ = self.sock.accept()
+        except BlockingIOError:
+            return None
+        conn.setblocking(True)
+        conn.settimeout(TIMEOUT)
+        try:
+            request = read_line(conn)
+        except (OSError, ValueError) as e:
+            conn.close()
+            print('KarelCraft daemon: invalid request', e)
+            return None
+        return conn, request
+
+    def reply(self, conn, status: str, message: str) -> None:
+        try:
+            send_line(conn, {'status': status, 'message': message})
+        except OSError:
+            pass  # the client gave up waiting
+        finally:
+            conn.close()
+
+    def close(self) -> None:
+        self.sock.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
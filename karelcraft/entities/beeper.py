@@ -1,18 +1,32 @@
 from ursina import *
 
 
-class Beeper(Entity):
+class Beeper:
+    '''
+    A beeper in a world stack. Consecutive beepers of a stack share one
+    BeeperPile entity, which shows the topmost one's count
+    '''
+    name = 'beeper'
+
+    def __init__(self, position=(0, 0, 0), num_beepers=0, pile=None):
+        self.position = Vec3(*position)
+        self.num_beepers = num_beepers
+        self.pile = pile
+
+
+class BeeperPile(Entity):
 
     def __init__(self, position=(0, 0, 0), num_beepers=0):
         super().__init__(
+            name='beeper',
             model='quad',
             parent=scene,
             scale=1.1,
             position=position,
             color=color.green,
             texture='icon.png',
-            collider='box'
         )
+        self.beepers = []
         self.num_beepers = num_beepers
         self.create_text()
 
@@ -29,3 +43,30 @@ class Beeper(Entity):
         self.txt.y -= 0.30
         self.txt.x -= 0.14
         # self.txt.create_background(radius=1, padding=1)
+
+    @property
+    def top(self) -> Beeper:
+        return self.beepers[-1] if self.beepers else None
+
+    def push(self, beepers: list) -> None:
+        if not beepers:
+            return
+        for beeper in beepers:
+            beeper.pile = self
+        self.beepers.extend(beepers)
+        self.show_top()
+
+    def pop(self) -> Beeper:
+        beeper = self.beepers.pop()
+        if self.beepers:
+            self.show_top()
+        return beeper
+
+    def show_top(self) -> None:
+        '''
+        Moves the pile up or down to its top beeper and relabels it
+        '''
+        self.position = self.top.position
+        if self.num_beepers != self.top.num_beepers:
+            self.num_beepers = self.top.num_beepers
+            self.txt.text = f'{self.num_beepers}'
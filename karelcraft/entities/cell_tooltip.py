@@ -0,0 +1,34 @@
+from ursina import *
+
+
+class CellTooltip(Entity):
+    '''
+    A single tooltip shared by all cells of a world. The Tooltip text entity
+    is only created on the first hover, and its text is only formatted
+    when the hovered cell or the top of its stack changes.
+    '''
+
+    def __init__(self, world):
+        super().__init__(name='cell_tooltip', parent=world)
+        self.world = world
+        self.tooltip = None
+        self.shown = None  # (key, top item) currently described
+
+    def update(self) -> None:
+        key = self.world.hovered_key()
+        top = self.world.top_in_stack(key) if key else None
+        if top is None:
+            if self.tooltip:
+                self.tooltip.enabled = False
+            self.shown = None
+            return
+        if self.shown != (key, top):
+            self.shown = (key, top)
+            if self.tooltip is None:
+                self.tooltip = Tooltip('')
+            self.tooltip.text = self.world.describe(key)
+        self.tooltip.enabled = True
+
+    def on_destroy(self) -> None:
+        if self.tooltip:
+            destroy(self.tooltip)
@@ -0,0 +1,108 @@
+from ursina import *
+from karelcraft.entities.voxel import FACES
+from karelcraft.utils.helpers import vec2key
+
+CHUNK_SIZE = 16
+# two blocks touch if their positions are this close in z
+Z_DECIMALS = 2
+
+
+class VoxelChunk(Entity):
+    '''
+    The blocks of a CHUNK_SIZE x CHUNK_SIZE column of cells as one mesh
+    '''
+
+    def __init__(self):
+        super().__init__(name='voxel', parent=scene)
+
+
+class ChunkedVoxels(Entity):
+    '''
+    Draws the voxels of a world's stacks Minecraft-style: cells are grouped
+    in chunks, each chunk is one mesh with the faces between touching blocks
+    left out, and a chunk is only rebuilt, once per frame, after it changed
+    '''
+
+    def __init__(self, world, atlas):
+        super().__init__(name='chunks', parent=world)
+        self.world = world
+        self.atlas = atlas
+        self.chunks: dict[tuple[int, int], VoxelChunk] = {}
+        self.dirty = set()
+        self.height_hits = 0  # heights() cache, see karelcraft.utils.metrics_export
+        self.height_misses = 0
+
+    def mark_dirty(self, position) -> None:
+        col, row = vec2key(position)
+        for dx, dy in ((0, 0), (-1, 0), (1, 0), (0, -1), (0, 1)):
+            # neighbours in other chunks may gain or lose a hidden face
+            self.dirty.add(((col + dx) // CHUNK_SIZE, (row + dy) // CHUNK_SIZE))
+
+    def clear(self) -> None:
+        self.dirty.update(self.chunks)
+
+    def update(self) -> None:
+        if self.dirty:
+            for chunk_key in self.dirty:
+                self.rebuild(chunk_key)
+            self.dirty.clear()
+
+    def on_destroy(self) -> None:
+        for chunk in self.chunks.values():
+            destroy(chunk)
+        self.chunks.clear()
+
+    def heights(self, key, cache) -> set:
+        if key in cache:
+            self.height_hits += 1
+            return cache[key]
+        self.height_misses += 1
+        cache[key] = {round(item.position.z, Z_DECIMALS)
+                      for item in self.world.stacks.get(key, []) if item.name == 'voxel'}
+        return cache[key]
+
+    def rebuild(self, chunk_key) -> None:
+        vertices, triangles, uvs, normals, colors = [], [], [], [], []
+        cache = {}
+        x0, y0 = chunk_key[0] * CHUNK_SIZE, chunk_key[1] * CHUNK_SIZE
+        for col in range(x0, x0 + CHUNK_SIZE):
+            for row in range(y0, y0 + CHUNK_SIZE):
+                stack = self.world.stacks.get((col, row))
+                if not stack:
+                    continue
+                for idx, item in enumerate(stack):
+                    if item.name != 'voxel':
+                        continue
+                    z = round(item.position.z, Z_DECIMALS)
+                    below = stack[idx - 1] if idx else None
+                    above = stack[idx + 1] if idx + 1 < len(stack) else None
+                    offset = self.atlas.tile_offset(item.texture_name)
+                    scale = self.atlas.tile_scale
+                    shade = color.color(0, 0, item.shade)
+                    for normal, corners in FACES.items():
+                        if normal[2] == -1 and above is not None and above.name == 'voxel':
+                            continue
+                        if normal[2] == 1 and below is not None and below.name == 'voxel':
+                            continue
+                        if normal[2] == 0 and \
+                                z in self.heights((col + normal[0], row + normal[1]), cache):
+                            continue
+                        start = len(vertices)
+                        for corner, uv in corners:
+                            vertices.append(item.position + Vec3(*corner))
+                            uvs.append((offset[0] + uv[0] * scale[0], offset[1] + uv[1] * scale[1]))
+                            normals.append(normal)
+                            colors.append(shade)
+                        triangles.extend((start, start + 1, start + 2, start + 2, start + 3, start))
+
+        chunk = self.chunks.get(chunk_key)
+        if not vertices:
+            if chunk is not None:
+                destroy(chunk)
+                del self.chunks[chunk_key]
+            return
+        if chunk is None or chunk.isEmpty():  # new, or destroyed by App.clear_objects()
+            chunk = self.chunks[chunk_key] = VoxelChunk()
+        chunk.model = Mesh(vertices=vertices, triangles=triangles, uvs=uvs,
+                           normals=normals, colors=colors)
+        chunk.texture = self.atlas.texture
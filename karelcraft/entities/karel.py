@@ -2,13 +2,15 @@ from ursina import *
 from abc import abstractmethod
 from karelcraft.utils.helpers import INFINITY, KarelException
 from karelcraft.utils.direction import Direction
+from karelcraft.entities.latest_text import LatestText
 from karelcraft.entities.world import World
+from karelcraft.utils.texture_atlas import TextureAtlas
 from karelcraft.utils.helpers import vec2key
 
 
 class Karel(Button):
 
-    def __init__(self, world_file: str, textures: dict) -> None:
+    def __init__(self, world_file: str, textures: TextureAtlas) -> None:
         super().__init__(
             parent=scene,
             color=color.white66,
@@ -29,11 +31,14 @@ class Karel(Button):
         self.world_file = world_file
         self.textures = textures
         self.world = World(self.world_file, self.textures)
+        self.tween_duration = 0  # seconds to glide to the next cell, see move()
+        self.tween = None
         self.agent_text()
         self.reset()
 
     def reset(self, new_position=None) -> tuple:
         self.world.reset()
+        self.stop_tween()
         key = self.world.world_loader.start_location
         if new_position:
             key = new_position
@@ -42,25 +47,40 @@ class Karel(Button):
         self.face2direction()
         self.start_beeper_count = self.world.world_loader.start_beeper_count
         self.num_beepers = self.start_beeper_count
+        self.observe_pose()
         return (int(key[0]), int(key[1]))
 
+    def set_pose(self, key, direction: Direction, num_beepers: int) -> None:
+        '''
+        Puts Karel on top of the stack of cell key, e.g. to show a replayed state
+        '''
+        self.stop_tween()
+        self.position = Vec3(key[0], key[1], self.world.top_position(key)[-1])
+        self.direction = direction
+        self.face2direction()
+        self.num_beepers = num_beepers
+        self.observe_pose()
+
     def agent_text(self) -> None:
         msg = f'Press Run Button'
-        self.agent_txt = Text(msg,
-                              position=window.center + Vec2(-0.85, 0.43),
-                              scale=1,
-                              parent=camera.ui
-                              )
+        self.agent_txt = LatestText(msg,
+                                    position=window.center + Vec2(-0.85, 0.43),
+                                    scale=1,
+                                    parent=camera.ui
+                                    )
 
     def user_action(self, key) -> tuple:
         if self.direction != self.directions[key]:
             self.direction = self.directions[key]
             self.face2direction()
+            self.observe_pose()
             return ('turn_left()', self.world.is_inside(self.position))
         else:
             is_valid_move = self.direction_is_clear(self.direction)
             self.position += self.direction.value
             self.position = self.world.top_position(self.position)
+            if self.world.is_inside(self.position):
+                self.observe_pose()
             return ('move()', is_valid_move)
 
     def move(self) -> None:
@@ -71,8 +91,32 @@ class Karel(Button):
                 'move()',
                 "ERROR attempt to move()",
             )
+        if self.tween_duration and self.model:
+            # from where it is shown, mid-glide if still tweening
+            self.tween = (Vec3(*self.model.getPos(scene)), 0.0)
         self.position += self.direction.value
         self.position = self.world.top_position(self.position)  # depth
+        self.observe_pose()
+
+    def update(self) -> None:
+        '''
+        Glides the model from where it was shown to Karel's cell; the
+        entity itself is already there, so the world logic never waits
+        '''
+        if self.tween is None:
+            return
+        start, elapsed = self.tween
+        elapsed += time.dt
+        if elapsed >= self.tween_duration:
+            self.stop_tween()
+            return
+        self.tween = (start, elapsed)
+        self.model.setPos(scene, lerp(start, Vec3(*self.getPos(scene)), elapsed / self.tween_duration))
+
+    def stop_tween(self) -> None:
+        self.tween = None
+        if self.model:  # None if the model file was not found
+            self.model.setPos(0, 0, 0)
 
     def facing_east(self) -> bool:
         return self.direction.name == 'EAST'
@@ -112,11 +156,13 @@ class Karel(Button):
         self.direction = Direction.rotate90(self.direction)
         self.face2direction()
         self.position = self.world.top_position(self.position)  # depth
+        self.observe_pose()
 
     def turn_right(self) -> None:
         self.direction = Direction.rotate90(self.direction, 'counterclockwise')
         self.face2direction()
         self.position = self.world.top_position(self.position)  # depth
+        self.observe_pose()
 
     def direction_is_clear(self, direction) -> bool:
         is_wall = self.world.wall_exists(self.position, direction)
@@ -198,6 +244,24 @@ class Karel(Button):
     def paint_corner(self, color_str: str) -> None:
         self.world.paint_corner(self.item_position(), color_str)
 
+    def paint_region(self, cells, color_str: str) -> int:
+        num_of_cells = self.world.paint_region(cells, color_str)
+        self.update_z()
+        return num_of_cells
+
+    def put_beepers(self, cells, counts=1) -> int:
+        '''
+        Sets up beepers on many cells at once; the beeper bag is not used
+        '''
+        num_of_beepers = self.world.put_beepers(cells, counts)
+        self.update_z()
+        return num_of_beepers
+
+    def place_blocks(self, mask, texture_name: str) -> int:
+        num_of_blocks = self.world.place_blocks(mask, texture_name)
+        self.update_z()
+        return num_of_blocks
+
     def corner_color_is(self, color: str) -> bool:
         return self.world.corner_color(self.item_position()) == color
 
@@ -250,5 +314,19 @@ class Karel(Button):
     def world_size(self) -> tuple:
         return tuple(self.world.size)
 
+    def observe_pose(self) -> None:
+        if self.world.observation is not None:
+            self.world.observation.update_karel(vec2key(self.position), self.direction)
+
+    def get_observation(self, shared_name: str = None):
+        '''
+        Returns the world as a (C, rows, cols) array that is updated in place,
+        see karelcraft.utils.observation for the channel layout
+        '''
+        if self.world.observation is None:
+            self.world.enable_observation(shared_name)
+            self.observe_pose()
+        return self.world.observation.array
+
     def prompt(self, msg) -> None:
-        self.agent_txt.text = msg
+        self.agent_txt.show(msg)
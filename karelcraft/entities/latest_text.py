@@ -0,0 +1,27 @@
+from ursina import *
+
+
+class LatestText(Text):
+    '''
+    Text that is laid out at most once per rendered frame: show() only
+    records the latest text and color, update() applies it before the
+    frame is drawn, so fast programs do not rebuild the text per action
+    '''
+
+    def __init__(self, text='', **kwargs):
+        super().__init__(text, **kwargs)
+        self.ignore = False  # Text skips update() by default
+        self.latest = None  # (text, color) not shown yet
+
+    def show(self, text: str, text_color=None) -> None:
+        self.latest = (text, text_color)
+
+    def update(self) -> None:
+        if self.latest is None:
+            return
+        text, text_color = self.latest
+        self.latest = None
+        if text_color is not None and text_color != self.color:
+            self.color = text_color
+        if text != self.raw_text:
+            self.text = text
@@ -1,14 +1,83 @@
 from ursina import *
+from karelcraft.entities.chunk import CHUNK_SIZE
+from karelcraft.utils.helpers import vec2key
 
+# corners of the former per-paint 'quad' model around a paint's position
+QUAD = ((-.5, -.5), (.5, -.5), (.5, .5), (-.5, .5))
 
-class Paint(Button):
+
+class Paint:
+    '''
+    A paint in a world stack. Paints are not entities of their own, they
+    are drawn by the PaintChunk covering their cell, see ChunkedPaints
+    '''
+    name = 'paint'
 
     def __init__(self, position=(0, 0, 0), name='green'):
-        super().__init__(
-            model='quad',
-            parent=scene,
-            scale=1,
-            position=position,
-            color=color.colors[name],
-            collider='box',
-        )
+        self.position = Vec3(*position)
+        self.color = color.colors[name]
+
+
+class PaintChunk(Entity):
+    '''
+    The paints of a CHUNK_SIZE x CHUNK_SIZE column of cells as one mesh
+    '''
+
+    def __init__(self):
+        super().__init__(name='paint', parent=scene)
+
+
+class ChunkedPaints(Entity):
+    '''
+    Draws the paints of a world's stacks a chunk at a time, like
+    ChunkedVoxels, so painting a whole region adds no entity per cell;
+    a chunk is only rebuilt, once per frame, after it changed
+    '''
+
+    def __init__(self, world):
+        super().__init__(name='paints', parent=world)
+        self.world = world
+        self.chunks: dict[tuple[int, int], PaintChunk] = {}
+        self.dirty = set()
+
+    def mark_dirty(self, position) -> None:
+        col, row = vec2key(position)
+        self.dirty.add((col // CHUNK_SIZE, row // CHUNK_SIZE))
+
+    def clear(self) -> None:
+        self.dirty.update(self.chunks)
+
+    def update(self) -> None:
+        if self.dirty:
+            for chunk_key in self.dirty:
+                self.rebuild(chunk_key)
+            self.dirty.clear()
+
+    def on_destroy(self) -> None:
+        for chunk in self.chunks.values():
+            destroy(chunk)
+        self.chunks.clear()
+
+    def rebuild(self, chunk_key) -> None:
+        vertices, triangles, colors = [], [], []
+        x0, y0 = chunk_key[0] * CHUNK_SIZE, chunk_key[1] * CHUNK_SIZE
+        for col in range(x0, x0 + CHUNK_SIZE):
+            for row in range(y0, y0 + CHUNK_SIZE):
+                for item in self.world.stacks.get((col, row), ()):
+                    if item.name != 'paint':
+                        continue
+                    start = len(vertices)
+                    for dx, dy in QUAD:
+                        vertices.append(item.position + Vec3(dx, dy, 0))
+                        colors.append(item.color)
+                    triangles.extend((start, start + 1, start + 2, start + 2, start + 3, start))
+
+        chunk = self.chunks.get(chunk_key)
+        if not vertices:
+            if chunk is not None:
+                destroy(chunk)
+                del self.chunks[chunk_key]
+            return
+        if chunk is None or chunk.isEmpty():  # new, or destroyed by App.clear_objects()
+            chunk = self.chunks[chunk_key] = PaintChunk()
+        chunk.model = Mesh(vertices=vertices, triangles=triangles, colors=colors)
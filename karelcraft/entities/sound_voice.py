@@ -0,0 +1,30 @@
+from ursina import *
+
+MIN_INTERVAL = 0.1  # seconds between two starts of the sound
+
+
+class SoundVoice(Entity):
+    '''
+    A single voice for a sound effect: play() only requests it, and
+    update() starts it at most once per min_interval seconds, so
+    thousands of actions per second do not pile up overlapping sounds
+    '''
+
+    def __init__(self, sound_file: str, min_interval: float = MIN_INTERVAL):
+        super().__init__(name='sound_voice')
+        self.audio = Audio(sound_file, autoplay=False)
+        self.min_interval = min_interval
+        self.requested = False
+        self.last_played = -min_interval
+
+    def play(self) -> None:
+        self.requested = True
+
+    def update(self) -> None:
+        if not self.requested:
+            return
+        now = time.perf_counter()
+        if now - self.last_played >= self.min_interval:
+            self.requested = False
+            self.last_played = now
+            self.audio.play()
@@ -1,18 +1,33 @@
-from ursina import *
+from ursina import Vec3
+import random
 
+# faces of the former per-voxel 'assets/block' model around a voxel's
+# position: normal -> quad corners as (offset, uv in the block texture);
+# up is -z, the block spans z in [-0.25, 0.75] around its position
+FACES = {
+    (0, -1, 0): (((.5, -.5, .75), (.375, 0)), ((.5, -.5, -.25), (.625, 0)),
+                 ((-.5, -.5, -.25), (.625, .25)), ((-.5, -.5, .75), (.375, .25))),
+    (-1, 0, 0): (((-.5, -.5, .75), (.375, .25)), ((-.5, -.5, -.25), (.625, .25)),
+                 ((-.5, .5, -.25), (.625, .5)), ((-.5, .5, .75), (.375, .5))),
+    (0, 1, 0): (((-.5, .5, .75), (.375, .5)), ((-.5, .5, -.25), (.625, .5)),
+                ((.5, .5, -.25), (.625, .75)), ((.5, .5, .75), (.375, .75))),
+    (1, 0, 0): (((.5, .5, .75), (.375, .75)), ((.5, .5, -.25), (.625, .75)),
+                ((.5, -.5, -.25), (.625, 1)), ((.5, -.5, .75), (.375, 1))),
+    (0, 0, 1): (((-.5, -.5, .75), (.125, .5)), ((-.5, .5, .75), (.375, .5)),
+                ((.5, .5, .75), (.375, .75)), ((.5, -.5, .75), (.125, .75))),
+    (0, 0, -1): (((-.5, .5, -.25), (.625, .5)), ((-.5, -.5, -.25), (.875, .5)),
+                 ((.5, -.5, -.25), (.875, .75)), ((.5, .5, -.25), (.625, .75))),
+}
 
-class Voxel(Button):
 
-    def __init__(self, position=(0, 0, 0), texture=None):
-        super().__init__(
-            parent=scene,
-            position=position + Vec3(0, 0, -0.75),
-            rotation=Vec3(0, 90, 90),
-            model='assets/block',
-            origin_y=0.5,
-            texture=texture,
-            color=color.color(0, 0, random.uniform(0.9, 1)),
-            scale=0.5
-        )
-        self.highlight_color = self.color.tint(.2)
-        self.texture_name = self.texture.name.split('_')[0]
+class Voxel:
+    '''
+    A block in a world stack. Blocks are not entities of their own, they
+    are drawn by the VoxelChunk covering their cell (see entities/chunk.py)
+    '''
+    name = 'voxel'
+
+    def __init__(self, position=(0, 0, 0), texture_name='grass'):
+        self.position = Vec3(*position) + Vec3(0, 0, -0.75)
+        self.texture_name = texture_name
+        self.shade = random.uniform(0.9, 1)  # same brightness jitter as before
@@ -1,19 +1,68 @@
 from ursina import *
 from karelcraft.utils.direction import Direction
 
+WALL_THICKNESS = 0.05
+WALL_HEIGHT = 2
 
-class Wall(Button):
 
-    def __init__(self, position=(0, 0, -0.5), direction=Direction.EAST):
+class WallMesh(Entity):
+    '''
+    All walls of a world as one generated mesh, i.e. one node and one draw
+    call however many walls there are; rebuilt at most once per frame,
+    after the walls changed
+    '''
+
+    def __init__(self, walls=()):
         super().__init__(
-            model='cube',
+            name='wall',
             parent=scene,
-            position=position,
             color=color.white33,
-            scale=Vec3(2, 0.05, 1),
         )
-        self.position += 0.5*Vec3(direction.value)
-        if direction == Direction.EAST or direction == Direction.WEST:
-            self.rotation = Vec3(90, 90, 0)
+        # one node is sorted as a whole among transparent objects, so it must
+        # not hide Karel or items standing between its walls
+        self.setDepthWrite(False)
+        self.dirty = False
+        self.rebuild(walls)
+
+    def mark_dirty(self) -> None:
+        self.dirty = True
+
+    def update(self) -> None:
+        if self.dirty:
+            self.rebuild(self.walls)
+
+    def rebuild(self, walls) -> None:
+        self.walls = walls  # the world's set, read again by update()
+        self.dirty = False
+        vertices, normals = [], []
+        for wall in walls:
+            self.add_box(vertices, normals, wall)
+        self.model = Mesh(vertices=vertices, normals=normals, mode='triangle')
+
+    @staticmethod
+    def add_box(vertices, normals, wall) -> None:
+        '''
+        Appends the 12 triangles of a wall's box, as placed by the former
+        per-wall cube: a thin slab on the border of cell (col, row)
+        '''
+        dx, dy = wall.direction.value[:2]
+        center = (wall.col + 0.5 * dx, wall.row + 0.5 * dy, -WALL_HEIGHT / 2)
+        if wall.direction == Direction.EAST or wall.direction == Direction.WEST:
+            half = (WALL_THICKNESS / 2, 0.5, WALL_HEIGHT / 2)
         else:
-            self.rotation = Vec3(0, 90, 0)
+            half = (0.5, WALL_THICKNESS / 2, WALL_HEIGHT / 2)
+        for axis in range(3):
+            u, v = (axis + 1) % 3, (axis + 2) % 3
+            for sign in (-1, 1):
+                normal = [0, 0, 0]
+                normal[axis] = sign
+                corners = []
+                for su, sv in ((-1, -1), (1, -1), (1, 1), (-1, 1)):
+                    corner = list(center)
+                    corner[axis] += sign * half[axis]
+                    corner[u] += su * half[u]
+                    corner[v] += sv * half[v]
+                    corners.append(tuple(corner))
+                for idx in (0, 1, 2, 2, 3, 0):
+                    vertices.append(corners[idx])
+                    normals.append(tuple(normal))
@@ -1,13 +1,19 @@
 from ursina import *
 from karelcraft.entities.voxel import Voxel
-from karelcraft.entities.beeper import Beeper
-from karelcraft.entities.paint import Paint
-from karelcraft.entities.wall import Wall
-from karelcraft.utils.helpers import vec2tup, vec2key
-from karelcraft.utils.world_loader import WorldLoader, COLOR_LIST, TEXTURE_LIST
+from karelcraft.entities.chunk import ChunkedVoxels
+from karelcraft.entities.cell_tooltip import CellTooltip
+from karelcraft.entities.beeper import Beeper, BeeperPile
+from karelcraft.entities.paint import Paint, ChunkedPaints
+from karelcraft.entities.wall import WallMesh
+from karelcraft.utils.action_scheduler import speed_to_rate
+from karelcraft.utils.helpers import vec2key, cell_counts, mask_counts
+from karelcraft.utils.picking import pick_cell
+from karelcraft.utils.world_loader import WorldLoader, Wall, COLOR_LIST, TEXTURE_LIST
 from karelcraft.utils.direction import Direction
+from karelcraft.utils.texture_atlas import TextureAtlas
 from collections import defaultdict
 from typing import NamedTuple
+from panda3d.core import Point2, Point3
 
 
 class Size(NamedTuple):
@@ -21,7 +27,7 @@ class World(Entity):
     BEEPER_OFFSET_Z = 0.04
     VOXEL_OFFSET_Z = 0.28
 
-    def __init__(self, world_file: str, textures: dict) -> None:
+    def __init__(self, world_file: str, textures: TextureAtlas) -> None:
         super().__init__(
             model='quad',
             parent=scene,
@@ -29,25 +35,34 @@ class World(Entity):
         )
         self.world_loader = WorldLoader(world_file)
         self.textures = textures
+        self.observation = None
+        self.voxels = ChunkedVoxels(self, textures)
+        self.paints = ChunkedPaints(self)
+        self.tooltip = CellTooltip(self)
         self._init_params()
         self._create_grid()
         self.reset()
 
     def reset(self) -> None:
+        self.voxels.clear()
+        self.paints.clear()
+        self._destroy_items()
         self.stacks: dict[tuple[int, int], list] = defaultdict(list)
-        self.walls = self.world_loader.walls
+        self.walls = set(self.world_loader.walls)  # add_wall() must not edit the loader
         self._load_beepers()
         self._load_paints()
         self._load_walls()
         self._load_blocks()
         self._load_stacks()
+        if self.observation is not None:
+            self.sync_observation()
 
     def _init_params(self) -> None:
         self.size = Size(self.world_loader.columns, self.world_loader.rows)
         self.set_position((self.size.col / 2, self.size.row / 2, 0))
         self.scale = Vec3(self.size.col, self.size.row, 0)
         self.world_position -= Vec3((0.5, 0.5, -0.01))
-        self.speed = self.world_loader.init_speed
+        self.speed = speed_to_rate(self.world_loader.init_speed)  # actions per second
         self.world_list = self.world_loader.available_worlds
 
     def _create_grid(self, height=-0.001) -> None:
@@ -60,13 +75,14 @@ class World(Entity):
 
     def _load_beepers(self) -> None:
         for key, val in self.world_loader.beepers.items():
-            for _ in range(val):
-                self.add_beeper(key)
+            if val:
+                self.add_beeper(key, val)
 
     def _load_walls(self) -> None:
-        for w in self.walls:
-            wall_pos = Vec3(w.col, w.row, -1)
-            Wall(position=wall_pos, direction=w.direction)
+        if getattr(self, 'wall_mesh', None) in scene.entities:  # not cleared
+            self.wall_mesh.rebuild(self.walls)
+        else:
+            self.wall_mesh = WallMesh(self.walls)
 
     def _load_paints(self) -> None:
         for key, paint in self.world_loader.corner_colors.items():
@@ -82,35 +98,64 @@ class World(Entity):
     def _load_stacks(self) -> None:
         for key, stack_string in self.world_loader.stack_strings.items():
             for item in stack_string.split():
-                initial = item[0]
-                if initial == 'b':
-                    self.add_beeper(key)
-                elif initial == 'p':
-                    paint_pos = Vec3(key[0], key[1], 0)
-                    self.paint_corner(paint_pos, COLOR_LIST[int(item[1:])])
-                elif initial == 'v':
-                    block_pos = Vec3(key[0], key[1], 0)
-                    texture_name = TEXTURE_LIST[int(item[1:])]
-                    self.add_voxel(block_pos, texture_name)
+                self._add_token(key, item)
+
+    def _add_token(self, key, item: str) -> None:
+        '''
+        Adds an item given as a stack_string() token
+        '''
+        initial = item[0]
+        if initial == 'b':
+            self.add_beeper(key)
+        elif initial == 'p':
+            paint_pos = Vec3(key[0], key[1], 0)
+            self.paint_corner(paint_pos, COLOR_LIST[int(item[1:])])
+        elif initial == 'v':
+            block_pos = Vec3(key[0], key[1], 0)
+            texture_name = TEXTURE_LIST[int(item[1:])]
+            self.add_voxel(block_pos, texture_name)
+
+    def set_stack(self, key, tokens) -> None:
+        '''
+        Replaces the stack of a cell by stack_string() tokens
+        '''
+        self._destroy_items(self.stacks.pop(key, []))
+        self.voxels.mark_dirty(key)
+        self.paints.mark_dirty(key)
+        for item in tokens:
+            self._add_token(key, item)
+        self._observe(key)
+
+    def show_state(self, stacks: dict, walls) -> None:
+        '''
+        Makes the world show the stacks (key -> stack_string() tokens) and
+        walls of e.g. a WorldModel; only the cells that differ are redrawn
+        '''
+        for key in set(self.stacks) | set(stacks):
+            tokens = list(stacks.get(key, ()))
+            if self.stack_string(key).split() != tokens:
+                self.set_stack(key, tokens)
+        if set(walls) != self.walls:
+            self.walls = set(walls)
+            self._load_walls()
+            if self.observation is not None:
+                self.observation.update_walls(self.walls)
 
     def paint_corner(self, position, color_str) -> None:
         self.remove_color(position)  # no stacking of paints
         key = vec2key(position)
         paint_pos = self.top_position(
             position) + Vec3(0, 0, - self.GROUND_OFFSET)
-        paint = Paint(paint_pos, color_str)
-        paint.tooltip = Tooltip(f'Paint@{vec2tup(position)}: {color_str}')
-        self.stacks[key].append(paint)
+        self.stacks[key].append(Paint(paint_pos, color_str))
+        self.paints.mark_dirty(key)
+        self._observe(key)
 
     def remove_color(self, position) -> None:
         if top := self.top_in_stack(position):
             if top.name == 'paint':
-                item = self.stacks[vec2key(position)].pop()
-                destroy(item, 1 - self.speed)
-        # # Linear logic
-        # for item in reversed(self.stacks):
-        #     if item.name == 'paint':
-        #         destroy(item, 1 - self.speed)
+                self.stacks[vec2key(position)].pop()
+                self.paints.mark_dirty(position)
+                self._observe(position)
 
     def corner_color(self, position) -> str:
         '''
@@ -129,40 +174,166 @@ class World(Entity):
         #         return item.color.name
         # return result
 
-    def add_beeper(self, position) -> int:
+    def add_beeper(self, position, count=1) -> int:
+        '''
+        Puts count beepers on the stack; beepers on top of beepers join
+        their pile, whose label and height are updated in place
+        '''
         key = vec2key(position)
-        beeper_pos = self.top_position(
-            position) + Vec3(0, 0, - self.GROUND_OFFSET)
-        idx = self.count_beepers(key)
-        beeper = Beeper(position=beeper_pos, num_beepers=idx + 1)
-        self.stacks[key].append(beeper)
-        return idx + 1
+        top = self.top_in_stack(key)
+        pile = top.pile if top and top.name == 'beeper' else None
+        if pile is None or pile.isEmpty():  # new pile, or cleared by the App
+            pile = BeeperPile(num_beepers=0)
+            pile.push(self._beeper_run(key))
+        num = self.count_beepers(key)
+        beepers = []
+        for _ in range(count):
+            beeper_pos = self.top_position(key) + Vec3(0, 0, - self.GROUND_OFFSET)
+            num += 1
+            beepers.append(Beeper(position=beeper_pos, num_beepers=num))
+            self.stacks[key].append(beepers[-1])
+        pile.push(beepers)
+        self._observe(key)
+        return num
 
     def remove_beeper(self, position) -> int:
         key = vec2key(position)
         beepers_in_stack = self.count_beepers(key)
         if top := self.top_in_stack(position):
             if top.name == 'beeper':
-                item = self.stacks[key].pop()
-                destroy(item, 1 - self.speed)
+                self.stacks[key].pop()
+                top.pile.pop()
+                if not top.pile.beepers:
+                    destroy(top.pile)
                 beepers_in_stack -= 1
+                self._observe(key)
         return beepers_in_stack
 
+    def _beeper_run(self, key) -> list:
+        '''
+        The consecutive beepers on top of the stack, bottom first
+        '''
+        item_stack = self.stacks.get(key, [])
+        start = len(item_stack)
+        while start and item_stack[start - 1].name == 'beeper':
+            start -= 1
+        return item_stack[start:]
+
+    def _destroy_items(self, items=None) -> None:
+        '''
+        Removes the entities drawing items, by default those of the
+        previous stacks, if any
+        '''
+        if items is None:
+            items = [item for item_stack in getattr(self, 'stacks', {}).values()
+                     for item in item_stack]
+        entities = set()
+        for item in items:
+            if isinstance(item, Beeper):
+                entities.add(item.pile)
+        for entity in entities:
+            if not entity.isEmpty():  # App.clear_objects() may have destroyed it
+                destroy(entity)
+
     def add_voxel(self, position, texture_name) -> None:
         key = vec2key(position)
+        if texture_name not in self.textures:
+            raise ValueError(f'Error: {texture_name} is not a valid block texture.')
         block_pos = self.top_position(position) + Vec3(0, 0, - self.GROUND_OFFSET)
-        texture = self.textures[texture_name]  # default grass
-        voxel = Voxel(position=block_pos, texture=texture)
-        texture_name = texture.name.split('.')[0]
-        position.z = abs(position.z)
-        voxel.tooltip = Tooltip(f'Block@{vec2tup(position)}: {texture_name}')
-        self.stacks[key].append(voxel)
+        self.stacks[key].append(Voxel(position=block_pos, texture_name=texture_name))
+        self.voxels.mark_dirty(key)
+        self._observe(key)
 
     def remove_voxel(self, position) -> None:
         if top := self.top_in_stack(position):
             if top.name == 'voxel':
-                item = self.stacks[vec2key(position)].pop()
-                destroy(item, 1 - self.speed)
+                self.stacks[vec2key(position)].pop()
+                self.voxels.mark_dirty(position)
+                self._observe(position)
+
+    def paint_region(self, cells, color_str: str) -> int:
+        '''
+        Paints all cells in one pass; returns the number of cells painted
+        '''
+        if color_str not in color.colors:
+            raise ValueError(f'Error: {color_str} is not a valid color.')
+        keys = list(cell_counts(cells))
+        self._check_cells(keys)
+        for key in keys:
+            self.paint_corner(Vec3(key[0], key[1], 0), color_str)
+        return len(keys)
+
+    def put_beepers(self, cells, counts=1) -> int:
+        '''
+        Puts counts beepers, one count for all cells or one per cell, on
+        each of the cells in one pass; returns the number of beepers put
+        '''
+        beepers = cell_counts(cells, counts)
+        self._check_cells(beepers)
+        if any(count < 0 for count in beepers.values()):
+            raise ValueError('Error: beeper counts must not be negative.')
+        for key, count in beepers.items():
+            if count:
+                self.add_beeper(key, count)
+        return sum(beepers.values())
+
+    def place_blocks(self, mask, texture_name: str) -> int:
+        '''
+        Stacks mask[row][col] blocks on each cell in one pass, see
+        helpers.mask_counts; returns the number of blocks placed
+        '''
+        if texture_name not in self.textures:
+            raise ValueError(f'Error: {texture_name} is not a valid block texture.')
+        blocks = mask_counts(mask)
+        self._check_cells(blocks)
+        for key, count in blocks.items():
+            for _ in range(count):
+                self.add_voxel(key, texture_name)
+        return sum(blocks.values())
+
+    def _check_cells(self, keys) -> None:
+        '''
+        Batch functions check every cell before changing any
+        '''
+        for key in keys:
+            if not self.is_inside(key):
+                raise ValueError(f'Error: {key} is outside the world.')
+
+    def enable_observation(self, shared_name: str = None):
+        '''
+        Starts maintaining a (C, rows, cols) observation tensor of the world,
+        optionally in shared memory; see karelcraft.utils.observation
+        '''
+        if self.observation is None:
+            # numpy is only needed by RL consumers, not by the app itself
+            from karelcraft.utils.observation import ObservationPlanes
+            self.observation = ObservationPlanes(self.size.col, self.size.row, shared_name)
+            self.sync_observation()
+        return self.observation
+
+    def sync_observation(self) -> None:
+        self.observation.clear()
+        for key in self.stacks:
+            self.observation.update_cell(key, self.stack_string(key).split())
+        self.observation.update_walls(self.walls)
+
+    def _observe(self, position) -> None:
+        if self.observation is not None:
+            key = vec2key(position)
+            self.observation.update_cell(key, self.stack_string(key).split())
+
+    def describe(self, key) -> str:
+        '''
+        Tooltip text of the top item of a cell
+        '''
+        top = self.top_in_stack(key)
+        if top is None:
+            return ''
+        if top.name == 'voxel':
+            return f'Block@{key}: {top.texture_name} x{self.count_blocks(key)}'
+        if top.name == 'paint':
+            return f'Paint@{key}: {top.color.name}'
+        return f'Beeper@{key}: {self.count_beepers(key)}'
 
     def is_inside(self, position) -> bool:
         return -0.50 < position[0] < self.size.col - 0.5 \
@@ -183,12 +354,35 @@ class World(Entity):
                 return top.position + Vec3(0, 0, self.GROUND_OFFSET - self.BEEPER_OFFSET_Z)
         return Vec3(position[0], position[1], self.GROUND_OFFSET)
 
+    def surface_height(self, key) -> float:
+        '''
+        z of the top face of a cell's stack, 0 for the ground (up is -z)
+        '''
+        if top := self.top_in_stack(key):
+            if top.name == 'voxel':
+                return top.position.z - 0.25  # see FACES in entities/voxel.py
+            return top.position.z
+        return 0
+
+    def hovered_key(self) -> tuple:
+        '''
+        The cell under the mouse, found by walking the mouse ray over the
+        stack heights instead of raycasting item colliders;
+        None when the mouse is over the UI or off the grid
+        '''
+        if mouse.hovered_entity and mouse.hovered_entity.has_ancestor(camera.ui):
+            return None
+        near, far = Point3(), Point3()
+        screen_point = Point2(mouse.x * 2 / window.aspect_ratio, mouse.y * 2)
+        if not camera.lens_node.get_lens().extrude(screen_point, near, far):
+            return None
+        return pick_cell(scene.getRelativePoint(camera, near),
+                         scene.getRelativeVector(camera, far - near),
+                         self.size, self.surface_height)
+
     def wall_exists(self, position, direction) -> bool:
-        key = vec2tup(position)[:2]
-        for w in self.world_loader.walls:
-            if (w.col, w.row, w.direction) == (key[0], key[1], direction):
-                return True
-        return False
+        key = vec2key(position)
+        return Wall(key[0], key[1], direction) in self.walls
 
     def get_center(self) -> tuple:
         x_center = self.scale.x // 2 if self.scale.x % 2 else self.scale.x // 2 - 0.5
@@ -215,7 +409,7 @@ class World(Entity):
 
     def all_same_blocks(self, key) -> tuple:
         is_same_texture = len(
-            set(i.texture for i in self.stacks.get(key, []))) == 1
+            set(getattr(i, 'texture_name', None) for i in self.stacks.get(key, []))) == 1
         return self.same_type(key, Voxel) and is_same_texture
 
     def same_type(self, key, object_type) -> bool:
@@ -257,10 +451,16 @@ class World(Entity):
         alt_wall = self.get_alt_wall(wall)
         if wall not in self.walls and alt_wall not in self.walls:
             self.walls.add(wall)
+            self.wall_mesh.mark_dirty()
+            if self.observation is not None:
+                self.observation.update_walls(self.walls)
 
     def remove_wall(self, wall: Wall) -> None:
         alt_wall = self.get_alt_wall(wall)
-        if wall in self.walls:
-            self.walls.remove(wall)
-        if alt_wall in self.walls:
-            self.walls.remove(alt_wall)
+        if wall not in self.walls and alt_wall not in self.walls:
+            return
+        self.walls.discard(wall)
+        self.walls.discard(alt_wall)
+        self.wall_mesh.mark_dirty()
+        if self.observation is not None:
+            self.observation.update_walls(self.walls)
@@ -11,11 +11,24 @@ Version: 1.0.0
 Date of Creation: 5/17/2021
 """
 from ursina import *
+from karelcraft.app_server import AppServer, resolve_world
 from karelcraft.entities.karel import Karel
 from karelcraft.entities.file_browser_save import FileBrowserSave
+from karelcraft.entities.sound_voice import SoundVoice
 from karelcraft.entities.video_recorder import VideoRecorder
-from karelcraft.utils.helpers import vec2tup, vec2key, KarelException
-from karelcraft.utils.student_code import StudentCode
+from karelcraft.utils.action_scheduler import (ActionScheduler, MIN_RATE, MAX_RATE,
+                                               slider_to_rate, rate_to_slider,
+                                               tween_duration)
+from karelcraft.utils.helpers import vec2tup, vec2key, KarelException, cell_counts, mask_counts
+from karelcraft.utils.action_trace import TraceWriter, state_hash
+from karelcraft.utils.trace_replay import TraceReplayer
+from karelcraft.utils.undo_log import UndoLog, Change, Pose
+from karelcraft.utils.line_profiler import LineProfiler
+from karelcraft.utils.metrics_export import MetricsExporter
+from karelcraft.utils.profiler import Profiler
+from karelcraft.utils.program_runner import ProgramRunner, StopProgram
+from karelcraft.utils.student_code import StudentCode, KAREL_FUNCTIONS
+from karelcraft.utils.texture_atlas import TextureAtlas
 from karelcraft.utils.world_loader import COLOR_LIST, TEXTURE_LIST
 from karelcraft.utils.control_panel import ControlPanel
 
@@ -23,22 +36,50 @@ from karelcraft.utils.control_panel import ControlPanel
 import sys
 import webbrowser
 import random
+import threading
+from collections import Counter
+from functools import wraps
 from pathlib import Path
-from time import sleep
+from time import perf_counter
 from typing import Callable
 
 BLOCKS_PATH = 'assets/blocks/'
 REPO_PATH = 'https://github.com/melvincabatuan/KarelCraft'
+FRAME_BUDGET = 1 / 60  # seconds of student commands run per frame at full speed
+ENTITY_KINDS = ('voxel', 'beeper', 'paint', 'wall', 'karel')  # reported by the metrics
 
 
 class App(Ursina):
 
-    def __init__(self, code_file: Path, world_file: str, development_mode=False) -> None:
+    def __init__(self, code_file: Path, world_file: str, development_mode=False,
+                 socket_path: str = None, trace_file: str = None,
+                 replay_file: str = None, profile: bool = False,
+                 line_profile: str = None, line_profile_sample: int = 1,
+                 metrics_file: str = None, metrics_port: int = None) -> None:
         super().__init__()
+        self.profiler = None  # see karelcraft.utils.profiler, report with F9 or at exit
+        if profile:
+            self.start_profiler()
+        self.metrics = None  # see karelcraft.utils.metrics_export
+        if metrics_file or metrics_port is not None:
+            self.metrics = MetricsExporter(metrics_file, metrics_port)
         self._setup_texture()
         self.karel = Karel(world_file, self.textures)
         self.world = self.karel.world
+        self.world_file = resolve_world(world_file)
         self.code_file = code_file
+        # warm-start daemon, see karelcraft.app_server
+        self.server = AppServer(socket_path) if socket_path else None
+        self.pending = None
+        self.runner = None  # the running student program, see run_student_code()
+        self.held_command = None  # an action waiting for the scheduler
+        self.trace_file = trace_file  # record each run, see karelcraft.utils.action_trace
+        self.trace = None
+        self.line_profile = line_profile  # stacks of each run, see karelcraft.utils.line_profiler
+        self.line_profile_sample = line_profile_sample  # profile every n-th call
+        self.line_profiler = None
+        self.replayer = None  # a recorded run being shown, see load_replay()
+        self.history = UndoLog()  # actions of the runs so far, see step_history()
         self.create_mode = ''  # default: None
         self.color_name = random.choice(COLOR_LIST)
         self._setup_code()
@@ -46,6 +87,10 @@ class App(Ursina):
         self._setup_menu()
         self._setup_sound_lights_cam()
         self._setup_window()
+        if replay_file:
+            self.load_replay(replay_file)
+        if self.metrics is not None:
+            self.start_metrics()  # once; it samples until close_metrics()
 
     def _setup_window(self) -> None:
         window.color = color.black
@@ -55,24 +100,21 @@ class App(Ursina):
         window.cog_menu.enabled = False
 
     def _setup_texture(self):
-        default_texture_path = Path(__file__).absolute().parent.parent / BLOCKS_PATH
-        self.textures = {
-            texture_path.stem.split('_')[0]: load_texture(BLOCKS_PATH + texture_path.stem + '.png')
-            for texture_path in default_texture_path.glob("*.png")
-        }
-        self.texture_names = list(self.textures.keys())
+        # the atlas image is only built/loaded when the first block is drawn
+        self.textures = TextureAtlas(Path(__file__).absolute().parent.parent / BLOCKS_PATH)
+        self.texture_names = self.textures.names
         self.texture_name = random.choice(self.texture_names)
-        self.block_texture = self.textures.get(self.texture_name, 'grass')
 
-    def _setup_code(self) -> None:
-        self.student_code = StudentCode(self.code_file)
+    def _setup_code(self, student_code: StudentCode = None) -> None:
+        self.student_code = student_code or StudentCode(self.code_file)
         self.student_code.inject_namespace(self.karel)
         self.inject_decorator_namespace()
-        self.run_code = False
+        self.stop_student_code()
 
     def _setup_sound_lights_cam(self):
-        self.move_sound = Audio('assets/sounds/move.mp3', autoplay=False)  # loop = True,
-        self.destroy_sound = Audio('assets/sounds/destroy.wav', autoplay=False)
+        # started at most once per frame interval, see SoundVoice
+        self.move_sound = SoundVoice('assets/sounds/move.mp3')
+        self.destroy_sound = SoundVoice('assets/sounds/destroy.wav')
         self.mute = False
         Light(type='ambient', color=(0.6, 0.6, 0.6, 1))
         Light(type='directional', color=(0.6, 0.6, 0.6, 1), direction=(1, 1, 1))
@@ -86,6 +128,8 @@ class App(Ursina):
         # run, top, and reset
         self.ui.run_button.on_click = self.set_run_code
         self.ui.stop_button.on_click = self.stop_code
+        self.ui.back_button.on_click = Func(self.step_history, -1)
+        self.ui.next_button.on_click = Func(self.step_history, 1)
         self.ui.reset_button.on_click = self.reset
 
         # camera view: 2d vs 3d
@@ -97,10 +141,12 @@ class App(Ursina):
         self.ui.view_button.on_value_changed = handle_view
 
         # speed slider
+        self.scheduler = ActionScheduler(self.world.speed)
         self.ui.set_speed_control(self.world.speed)
+        self.set_speed(self.world.speed)
 
         def handle_speed() -> None:
-            self.world.speed = self.ui.speed_slider.value
+            self.set_speed(slider_to_rate(self.ui.speed_slider.value))
         self.ui.speed_slider.on_value_changed = handle_speed
 
         # world selector
@@ -146,6 +192,7 @@ class App(Ursina):
         '''
         self.clear_objects()
         self.karel.reset()
+        self.history.clear()
 
     def set_3d(self) -> None:
         span = self.world.get_maxside()
@@ -169,7 +216,6 @@ class App(Ursina):
             self.texture_name = random.choice(self.texture_names)
         else:
             self.texture_name = self.texture_names[int(key) - 1]
-        # self.block_texture = self.textures[self.texture_name]
 
     def set_run_code(self) -> None:
         self.run_code = True
@@ -179,11 +225,14 @@ class App(Ursina):
         self.run_code = False
         self.ui.stop_button.disabled = True
 
-    def load_world(self, world_file: str) -> None:
+    def load_world(self, world_file: str, student_code: StudentCode = None) -> None:
         '''
         Loads a world, i.e. world_file, from ./karelcraft/worlds/ directory
         Destroy existing entities except UI, then, recreate them
         '''
+        load_start = perf_counter()
+        self.close_replay()
+        self.history.clear()
         to_destroy = [e for e in scene.entities
                       if e.name == 'voxel' or e.name == 'paint' or
                       e.name == 'beeper' or e.name == 'wall' or
@@ -193,16 +242,129 @@ class App(Ursina):
                 destroy(d)
             except Exception as e:
                 print('failed to destroy entity', e)
+        self.close_observation()
         del self.karel
         self.karel = Karel(world_file, self.textures)
         self.world = self.karel.world
-        self._setup_code()
-        self.world.speed = self.ui.speed_slider.value
+        self.world_file = resolve_world(world_file)
+        self._setup_code(student_code)
+        self.set_speed(self.scheduler.rate)
         self.set_3d()
         msg = f'Position : {vec2tup(self.karel.position)}; Direction: {self.karel.direction.name}'
         self.ui.update_prompt(vec2tup(self.karel.position),
                               self.karel.direction.name,
                               msg)
+        if self.metrics is not None:
+            self.metrics.counts['world_loads'] += 1
+            self.metrics.counts['world_load_seconds'] += perf_counter() - load_start
+
+    def load_program(self, code_file: Path, world_file: str) -> None:
+        '''
+        Swaps in another student program, and its world if it differs,
+        without restarting the app; the program starts running right away
+        '''
+        student_code = StudentCode(code_file)  # fail before touching the world
+        self.stop_student_code()
+        self.code_file = code_file
+        if world_file != self.world_file:
+            self.load_world(world_file, student_code)
+        else:
+            self.reset()
+            self._setup_code(student_code)
+        self.vr.video_name = self.student_code.module_name
+        self.set_run_code()
+
+    def pose(self) -> Pose:
+        return Pose(vec2key(self.karel.position), self.karel.direction, self.karel.num_beepers)
+
+    def world_stacks(self) -> dict:
+        stacks = {key: self.world.stack_string(key) for key in self.world.stacks}
+        return {key: stack for key, stack in stacks.items() if stack}
+
+    def history_snapshot(self) -> tuple:
+        return self.world_stacks(), self.pose()
+
+    def step_history(self, steps: int) -> None:
+        '''
+        Steps back (steps < 0) or forward through the actions of the runs
+        since the last reset, e.g. to the one before a crash; only while no
+        program is running. Running again continues from the shown step.
+        '''
+        if self.runner is not None:
+            return
+        snapshot, changes, backward = self.history.seek(self.history.step + steps)
+        pose = None
+        if snapshot is not None:
+            stacks, pose = snapshot
+            self.world.show_state({key: stack.split() for key, stack in stacks.items()},
+                                  self.world.walls)
+        for change in changes:
+            for key, (before, after) in change.cells.items():
+                self.world.set_stack(key, (before if backward else after).split())
+        if changes:
+            pose = changes[-1].before if backward else changes[-1].after
+        if pose is not None:
+            self.karel.set_pose(pose.key, pose.direction, pose.num_beepers)
+        action = f'{changes[-1].name}()' if changes else ''
+        self.ui.update_prompt(vec2tup(self.karel.position),
+                              self.karel.direction.name,
+                              f'step {self.history.step}/{self.history.last} {action}')
+
+    def load_replay(self, trace_file: str) -> None:
+        '''
+        Shows a run recorded with trace_file (see karelcraft.utils.trace_replay);
+        the replay slider and the , and . keys move through its steps
+        '''
+        replayer = TraceReplayer(trace_file)
+        if replayer.reader.world_file != self.world_file:
+            self.load_world(replayer.reader.world_file)
+        self.replayer = replayer
+        self.ui.set_replay_control(len(replayer), self.show_replay_step)
+        self.show_replay_step(0)
+
+    def show_replay_step(self, step: int) -> None:
+        replayer = self.replayer
+        replayer.seek(int(step))
+        model = replayer.model
+        self.world.show_state(model.stacks, model.walls)
+        self.karel.set_pose(model.position, model.direction, model.num_beepers)
+        action = f'{replayer.record.name}()' if replayer.record else 'start'
+        error_msg = None
+        if replayer.diverged_at is not None:
+            error_msg = f'Replay differs from the recording since step {replayer.diverged_at}'
+        self.ui.update_prompt(vec2tup(self.karel.position),
+                              self.karel.direction.name,
+                              f'step {replayer.step}/{len(replayer)}: {action}',
+                              error_msg)
+
+    def close_replay(self) -> None:
+        if self.replayer is not None:
+            self.replayer.close()
+            self.replayer = None
+            self.ui.close_replay_control()
+
+    def poll_server(self) -> None:
+        '''
+        Picks up a program submitted to the daemon; a running program is
+        stopped so the new one can take over
+        '''
+        if self.server is None or self.pending:
+            return
+        self.pending = self.server.poll()
+        if self.pending:
+            self.run_code = False
+
+    def serve_pending(self) -> None:
+        conn, request = self.pending
+        self.pending = None
+        code_file = Path(request.get('code_file', ''))
+        try:
+            self.load_program(code_file, request.get('world_file', ''))
+        except (Exception, SystemExit) as e:
+            message = str(e) or f'could not load {code_file.name}, see the daemon output'
+            self.server.reply(conn, 'error', message)
+            return
+        self.server.reply(conn, 'ok', f'running {code_file.name}')
 
     def save_world(self) -> None:
         wp = FileBrowserSave(file_type='.w')
@@ -247,19 +409,19 @@ class App(Ursina):
         Destroys the item - voxel, beeper, paint - hovered by the mouse
         Logic: You can only destroy the top of the stack
         '''
-        if to_destroy := mouse.hovered_entity:
-            pos_to_destroy = to_destroy.position
-            if not self.mute:
-                self.destroy_sound.play()
-            if to_destroy == self.world.top_in_stack(pos_to_destroy):
-                if to_destroy.name == 'voxel':
-                    self.world.remove_voxel(pos_to_destroy)
-                elif to_destroy.name == 'beeper':
-                    self.world.remove_beeper(pos_to_destroy)
-                elif to_destroy.name == 'paint':
-                    self.world.remove_color(pos_to_destroy)
-                if vec2key(pos_to_destroy) == vec2key(self.karel.position):
-                    self.karel.update_z()
+        key = self.world.hovered_key()
+        if key is None or not (to_destroy := self.world.top_in_stack(key)):
+            return
+        if not self.mute:
+            self.destroy_sound.play()
+        if to_destroy.name == 'voxel':
+            self.world.remove_voxel(key)
+        elif to_destroy.name == 'beeper':
+            self.world.remove_beeper(key)
+        elif to_destroy.name == 'paint':
+            self.world.remove_color(key)
+        if key == vec2key(self.karel.position):
+            self.karel.update_z()
 
     def create_item(self) -> None:
         '''
@@ -293,6 +455,9 @@ class App(Ursina):
             - Emergency stop: escape
             - Save world state: ctrl + s
             - Destroy objects: left mouse or mouse1
+            - Step back/forward through the run: z / y
+            - Replay step back/forward: , / .
+            - Print the profile (with profile=True): F9
         '''
         if key == 'w' or key == 'a' or key == 's' or key == 'd' \
                 or key == 'arrow_up' or key == 'arrow_down' \
@@ -313,10 +478,10 @@ class App(Ursina):
                 self.move_sound.play()
         elif key == '=':
             print("Make faster...")
-            self.world.speed = min(self.world.speed + 0.05, 1.0)
+            self.ui.speed_slider.value = rate_to_slider(min(self.world.speed * 2, MAX_RATE))
         elif key == '-':
             print("Make slower...")
-            self.world.speed = max(self.world.speed - 0.05, 0.0)
+            self.ui.speed_slider.value = rate_to_slider(max(self.world.speed / 2, MIN_RATE))
         elif key.isdigit() and '1' <= key <= '9':
             self.set_texture(key)
         elif key == 'page_down':
@@ -338,6 +503,13 @@ class App(Ursina):
             sys.exit()  # Manual mode
         elif key == 'control-s':
             self.save_world()
+        elif key == 'z':
+            self.step_history(-1)
+        elif key == 'y':
+            self.step_history(1)
+        elif key in (',', '.') and self.replayer:  # replay step back/forward
+            step = self.replayer.step + (1 if key == '.' else -1)
+            self.ui.replay_slider.value = max(0, min(step, len(self.replayer)))
         elif key == 'mouse1':  # left click
             self.destroy_item()
         elif key == 'mouse3':  # right click
@@ -347,129 +519,461 @@ class App(Ursina):
         elif key == 'space':
             self.vr.recording = True
             self.vr.convert_to_gif()
+        elif key == 'f9':
+            self.print_profile()
 
         super().input(key)
 
+    def start_profiler(self) -> None:
+        '''
+        Counts entity creation from now on; destroyed entities follow from
+        the number still alive
+        '''
+        profiler = self.profiler = Profiler()
+        profiler.alive_start = len(scene.entities)
+        entity_init = self.entity_init = Entity.__init__  # put back by stop_profiler()
+
+        def counted_init(entity, *args, **kwargs):
+            profiler.created += 1
+            entity_init(entity, *args, **kwargs)
+        Entity.__init__ = counted_init
+        self.phase_times = {'sim': 0., 'wait': 0.}
+
+    def end_profiler_frame(self, render_time: float) -> None:
+        self.profiler.frame(len(scene.entities), render=render_time, **self.phase_times)
+        self.phase_times = {'sim': 0., 'wait': 0.}
+
+    def print_profile(self) -> None:
+        if self.profiler is not None:
+            print(self.profiler.report())
+
+    def stop_profiler(self) -> None:
+        '''
+        Prints the final report and stops counting entity creation
+        '''
+        if self.profiler is not None:
+            self.print_profile()
+            Entity.__init__ = self.entity_init
+            self.profiler = None
+
+    def start_metrics(self) -> None:
+        '''
+        Registers what the metrics sampler reads; it runs on its own
+        thread, so it only reads counters and copies of shared lists
+        '''
+        metrics = self.metrics
+        metrics.add_count('actions', 'Karel actions carried out')
+        metrics.add_count('queries', 'Karel queries answered')
+        metrics.add_count('frames', 'Frames rendered')
+        metrics.add('world_loads_total', 'counter', 'Worlds loaded',
+                    lambda: metrics.counts['world_loads'])
+        metrics.add('world_load_seconds_total', 'counter', 'Seconds spent loading worlds',
+                    lambda: metrics.counts['world_load_seconds'])
+
+        def entities() -> dict:
+            kinds = Counter(e.name for e in list(scene.entities))
+            world_kinds = {kind: kinds.pop(kind, 0) for kind in ENTITY_KINDS}
+            return {**world_kinds, 'other': sum(kinds.values())}
+        metrics.add('entities', 'gauge', 'Live entities by kind', entities, label='kind')
+
+        def cache_hit_ratio() -> dict:
+            voxels = self.world.voxels
+            lookups = voxels.height_hits + voxels.height_misses
+            return {'chunk_heights': voxels.height_hits / lookups if lookups else 0.}
+        metrics.add('cache_hits_total', 'counter', 'Cache hits',
+                    lambda: {'chunk_heights': self.world.voxels.height_hits}, label='cache')
+        metrics.add('cache_misses_total', 'counter', 'Cache misses',
+                    lambda: {'chunk_heights': self.world.voxels.height_misses}, label='cache')
+        metrics.add('cache_hit_ratio', 'gauge', 'Cache hits per lookup', cache_hit_ratio,
+                    label='cache')
+
+        def queue_depths() -> dict:
+            runner = self.runner
+            return {'commands': runner.commands.qsize() if runner else 0,
+                    'held_actions': int(self.held_command is not None),
+                    'dirty_chunks': len(self.world.voxels.dirty)}
+        metrics.add('queue_depth', 'gauge', 'Items waiting per queue', queue_depths, label='queue')
+        metrics.start()
+
+    def close_observation(self) -> None:
+        '''
+        Frees the world's observation tensor, unlinking its shared memory
+        '''
+        if self.world.observation is not None:
+            self.world.observation.close(unlink=True)
+            self.world.observation = None
+
+    def close_metrics(self) -> None:
+        if self.metrics is not None:
+            self.metrics.close()
+            self.metrics = None
+
+    def set_speed(self, rate: float) -> None:
+        '''
+        Sets the pace of student actions in actions per second
+        '''
+        self.world.speed = rate
+        self.scheduler.rate = rate
+        self.karel.tween_duration = tween_duration(rate)
+        self.ui.show_speed(rate)
+
     def end_frame(self, msg) -> None:
         self.ui.update_prompt(vec2tup(self.karel.position),
                               self.karel.direction.name,
                               msg)
         if not self.mute:
             self.move_sound.play()
-        if not self.run_code:
-            sys.exit()
-        taskMgr.step()  # manual step Panda3D loop
-        sleep(1 - self.world.speed)  # delay by specified amount
+
+    def command(self, fn: Callable, *args, action: bool = True):
+        '''
+        Runs a Karel function called by the student program; from the
+        program's worker thread it is queued for the main thread
+        '''
+        if self.runner is not None and self.runner.on_worker():
+            if self.line_profiler is not None:
+                return self.line_profiler.call(self.runner.call, fn, *args, action=action)
+            return self.runner.call(fn, *args, action=action)
+        if threading.current_thread() is not threading.main_thread():
+            raise StopProgram  # the thread of a program that was stopped
+        return fn(*args)
 
     def karel_action_decorator(
         self, karel_fn: Callable[..., None]
     ) -> Callable[..., None]:
-        def wrapper() -> None:
+        @wraps(karel_fn)
+        def action() -> None:
             karel_fn()  # execute Karel function
             self.end_frame('\t' + karel_fn.__name__ + '()')
+
+        def wrapper() -> None:
+            self.command(action)
         return wrapper
 
     def corner_action_decorator(
         self, karel_fn: Callable[..., None]
     ) -> Callable[..., None]:
-        def wrapper(color: str = color.random_color()) -> None:
+        @wraps(karel_fn)
+        def action(color: str) -> None:
             karel_fn(color)
             self.end_frame(karel_fn.__name__ + f'("{color}")')
+
+        def wrapper(color: str = color.random_color()) -> None:
+            self.command(action, color)
         return wrapper
 
     def beeper_action_decorator(
         self, karel_fn: Callable[..., None]
     ) -> Callable[..., None]:
-        def wrapper() -> None:
+        @wraps(karel_fn)
+        def action() -> None:
             num_beepers = karel_fn()
             self.end_frame(karel_fn.__name__ + '() => ' + str(num_beepers))
+
+        def wrapper() -> None:
+            self.command(action)
         return wrapper
 
     def block_action_decorator(
         self, karel_fn: Callable[..., None]
     ) -> Callable[..., None]:
-        def wrapper(block_texture: str = TEXTURE_LIST[0]) -> None:
+        @wraps(karel_fn)
+        def action(block_texture: str) -> None:
             karel_fn(block_texture)
             self.end_frame(f'{karel_fn.__name__}() => {block_texture}')
+
+        def wrapper(block_texture: str = TEXTURE_LIST[0]) -> None:
+            self.command(action, block_texture)
+        return wrapper
+
+    def batch_action_decorator(
+        self, karel_fn: Callable[..., int]
+    ) -> Callable[..., int]:
+        '''
+        paint_region(), put_beepers(), place_blocks(): one command, one
+        frame and one undo step for all cells
+        '''
+        @wraps(karel_fn)
+        def action(cells, arg) -> int:
+            num = karel_fn(cells, arg)
+            self.end_frame(f'{karel_fn.__name__}() => {num}')
+            return num
+
+        def wrapper(cells, arg=1) -> int:
+            # generators are consumed once here, not by each decorator
+            if isinstance(cells, dict):
+                cells = dict(cells)
+            elif karel_fn.__name__ == 'place_blocks':
+                cells = [list(row) for row in cells]
+            else:
+                cells = list(cells)
+            if not isinstance(arg, (int, str)):
+                arg = list(arg)
+            return self.command(action, cells, arg)
         return wrapper
 
     def karel_reset_decorator(
         self, karel_fn: Callable[..., None]
     ) -> Callable[..., None]:
-        def wrapper(new_position: tuple = None) -> None:
-            self.clear_objects()
+        @wraps(karel_fn)
+        def action(new_position: tuple) -> tuple:
             new_position = karel_fn(new_position)  # execute Karel function
             self.end_frame('\treset()')
             return new_position
+
+        def wrapper(new_position: tuple = None) -> tuple:
+            return self.command(action, new_position)
         return wrapper
 
     def karel_prompt_decorator(
         self, karel_fn: Callable[..., None]
     ) -> Callable[..., None]:
         def wrapper(msg: str) -> None:
-            karel_fn(msg)
-            taskMgr.step()  # manual step Panda3D loop
-            sleep(1 - self.world.speed)
+            self.command(karel_fn, msg)
+        return wrapper
+
+    def karel_query_decorator(
+        self, karel_fn: Callable[..., None]
+    ) -> Callable[..., None]:
+        def wrapper(*args):
+            return self.command(karel_fn, *args, action=False)
+        return wrapper
+
+    def trace_decorator(
+        self, karel_fn: Callable[..., None]
+    ) -> Callable[..., None]:
+        @wraps(karel_fn)
+        def wrapper(*args):
+            if self.trace is None:
+                return karel_fn(*args)
+            try:
+                result = karel_fn(*args)
+            except Exception:
+                self.trace.record(karel_fn.__name__, args, failed=True)
+                raise
+            state = self.state_hash() if self.trace.hash_due else None
+            self.trace.record(karel_fn.__name__, args, state)
+            return result
+        return wrapper
+
+    def undo_decorator(
+        self, karel_fn: Callable[..., None]
+    ) -> Callable[..., None]:
+        @wraps(karel_fn)
+        def wrapper(*args):
+            before = self.pose()
+            keys = self.changed_keys(karel_fn.__name__, args)
+            if keys is None:  # reset may change any cell
+                stacks = self.world_stacks()
+            else:
+                stacks = {key: self.world.stack_string(key) for key in keys}
+            result = karel_fn(*args)
+            if keys is None:
+                new_stacks = self.world_stacks()
+            else:
+                new_stacks = {key: self.world.stack_string(key) for key in keys}
+            cells = {key: (stacks.get(key, ''), new_stacks.get(key, ''))
+                     for key in set(stacks) | set(new_stacks)
+                     if stacks.get(key, '') != new_stacks.get(key, '')}
+            self.history.record(Change(karel_fn.__name__, cells, before, self.pose()),
+                                self.history_snapshot)
+            return result
         return wrapper
 
+    def changed_keys(self, name: str, args: tuple) -> list:
+        '''
+        The cells an action may change, None for any cell
+        '''
+        if name == 'reset':
+            return None
+        try:
+            if name == 'place_blocks':
+                return list(mask_counts(args[0]))
+            if name in ('paint_region', 'put_beepers'):
+                return list(cell_counts(args[0]))
+        except (ValueError, TypeError, IndexError):
+            return []  # the call fails as well and changes nothing
+        return [vec2key(self.karel.position)]  # the cell Karel stands on
+
     def inject_decorator_namespace(self) -> None:
         """
         This function associates the generic commands in student code
         to KarelCraft functions. (Credits: stanford.karel module)
         """
+        traced = self.trace_decorator
+        undoable = self.undo_decorator
+        # queries, e.g. front_is_clear(), go through the main thread as well
+        for func in KAREL_FUNCTIONS:
+            setattr(self.student_code.mod, func,
+                    self.karel_query_decorator(traced(getattr(self.karel, func))))
         self.student_code.mod.turn_left = self.karel_action_decorator(
-            self.karel.turn_left
+            undoable(traced(self.karel.turn_left))
         )
         self.student_code.mod.turn_right = self.karel_action_decorator(
-            self.karel.turn_right
+            undoable(traced(self.karel.turn_right))
         )
         self.student_code.mod.move = self.karel_action_decorator(
-            self.karel.move
+            undoable(traced(self.karel.move))
         )
         self.student_code.mod.put_beeper = self.beeper_action_decorator(
-            self.karel.put_beeper
+            undoable(traced(self.karel.put_beeper))
         )
         self.student_code.mod.pick_beeper = self.beeper_action_decorator(
-            self.karel.pick_beeper
+            undoable(traced(self.karel.pick_beeper))
         )
         self.student_code.mod.paint_corner = self.corner_action_decorator(
-            self.karel.paint_corner
+            undoable(traced(self.karel.paint_corner))
         )
         self.student_code.mod.put_block = self.block_action_decorator(
-            self.karel.put_block
+            undoable(traced(self.karel.put_block))
         )
         self.student_code.mod.destroy_block = self.karel_action_decorator(
-            self.karel.destroy_block
+            undoable(traced(self.karel.destroy_block))
         )
         self.student_code.mod.remove_paint = self.karel_action_decorator(
-            self.karel.remove_paint
+            undoable(traced(self.karel.remove_paint))
         )
+        for func in ('paint_region', 'put_beepers', 'place_blocks'):
+            setattr(self.student_code.mod, func,
+                    self.batch_action_decorator(undoable(traced(getattr(self.karel, func)))))
         self.student_code.mod.reset = self.karel_reset_decorator(
-            self.karel.reset
+            undoable(traced(self.karel.reset))
         )
         self.student_code.mod.prompt = self.karel_prompt_decorator(
-            self.karel.prompt
+            traced(self.karel.prompt)
         )
 
     def run_student_code(self) -> None:
+        '''
+        Starts the student's main() on a worker thread; the Karel functions
+        it calls are carried out by step_student_code() between frames
+        '''
         window.title = 'Running ' + self.student_code.module_name + '.py'
         # base.win.requestProperties(window)
         self.ui.stop_button.disabled = False
-        try:
-            self.student_code.mod.main()
-        except KarelException as e:
+        self.close_replay()
+        self.runner = ProgramRunner(self.student_code.mod.main)
+        self.held_command = None
+        self.scheduler.start()
+        if self.trace_file:
+            self.trace = TraceWriter(self.trace_file, self.world_file)
+        if self.line_profile:
+            self.line_profiler = LineProfiler(self.student_code.mod.__file__,
+                                              self.line_profile_sample)
+        self.runner.start()
+
+    def step_student_code(self) -> None:
+        '''
+        Executes the student program's queued commands for this frame:
+        queries are answered right away, actions are paced by the speed
+        slider, and a stop takes effect before the next frame
+        '''
+        if not self.run_code:
+            self.stop_student_code()
+            return
+        self.scheduler.tick()
+        frame_end = perf_counter() + FRAME_BUDGET
+        while (now := perf_counter()) < frame_end:
+            # only wait for the program while an action may still run this frame
+            timeout = frame_end - now if self.scheduler.ready() else 0
+            command = self.held_command or self.next_command(timeout)
+            self.held_command = None
+            if command is None:
+                break
+            if command.action and not self.scheduler.ready():
+                self.held_command = command
+                break
+            if self.execute_command(command):
+                self.scheduler.spend()
+        if self.runner.finished:
+            self.finish_student_code()
+
+    def next_command(self, timeout: float):
+        if self.profiler is None:
+            return self.runner.next_command(timeout=timeout)
+        start = perf_counter()
+        command = self.runner.next_command(timeout=timeout)
+        self.phase_times['wait'] += perf_counter() - start
+        return command
+
+    def execute_command(self, command) -> bool:
+        if self.profiler is None:
+            is_action = self.runner.execute(command)
+        else:
+            start = perf_counter()
+            is_action = self.runner.execute(command)
+            elapsed = perf_counter() - start
+            self.profiler.primitive(command.fn.__name__, elapsed)
+            self.phase_times['sim'] += elapsed
+        if self.metrics is not None:
+            self.metrics.counts['actions' if is_action else 'queries'] += 1
+        return is_action
+
+    def finish_student_code(self) -> None:
+        e = self.runner.exception
+        if isinstance(e, KarelException):
             self.ui.update_prompt(vec2tup(self.karel.position),
                                   self.karel.direction.name,
                                   e.action,
                                   e.message)
-            self.run_code = False
-            self.ui.run_button.disabled = False
-        except Exception as e:
+        elif isinstance(e, Exception):
             print(e)
-        except SystemExit:  # ignore traceback on exit
-            pass
+        self.runner = None
+        self.close_trace()
+        self.close_line_profile()
+        self.run_code = False
         self.ui.run_button.disabled = False
 
+    def stop_student_code(self) -> None:
+        '''
+        Abandons the running program, which raises StopProgram in its thread
+        at its next Karel function
+        '''
+        if self.runner is not None:
+            self.runner.stop()
+            self.runner = None
+            self.held_command = None
+            self.ui.run_button.disabled = False
+        self.close_trace()
+        self.close_line_profile()
+        self.run_code = False
+
+    def close_trace(self) -> None:
+        if self.trace is not None:
+            self.trace.close()
+            print(f'KarelCraft: recorded {self.trace.steps} steps to {self.trace.path}')
+            self.trace = None
+
+    def close_line_profile(self) -> None:
+        if self.line_profiler is not None:
+            print(self.line_profiler.table())
+            self.line_profiler.write_collapsed(self.line_profile)
+            print(f'KarelCraft: wrote the stacks of the run to {self.line_profile}')
+            self.line_profiler = None
+
+    def state_hash(self) -> int:
+        key = vec2key(self.karel.position)
+        return state_hash(key, self.karel.direction.name, self.karel.num_beepers,
+                          self.world.stack_string(key))
+
+    def step_frame(self) -> None:
+        '''
+        One turn of the main loop: render a frame, pick up a submitted
+        program, then carry out the student commands due in this frame
+        '''
+        start = perf_counter()
+        taskMgr.step()
+        if self.profiler is not None:
+            self.end_profiler_frame(perf_counter() - start)
+        if self.metrics is not None:
+            self.metrics.counts['frames'] += 1
+        self.poll_server()
+        if self.pending:
+            self.serve_pending()
+        if self.run_code and self.runner is None:
+            self.run_student_code()
+        if self.runner is not None:
+            self.step_student_code()
+
     def run_program(self) -> None:
         try:
             # Update the title
@@ -479,14 +983,19 @@ class App(Ursina):
             base.win.requestProperties(window)
 
             while True:
-                taskMgr.step()
-                if self.run_code:
-                    self.run_student_code()
-                    self.run_code = False
+                self.step_frame()
         except SystemExit:  # ignore traceback on exit
             pass
         except Exception as e:
             print(e)
+        finally:
+            self.close_trace()
+            self.close_line_profile()
+            self.stop_profiler()
+            self.close_metrics()
+            self.close_observation()
+            if self.server:
+                self.server.close()
 
     def finalizeExit(self) -> None:
         """
@@ -15,7 +15,7 @@ Date of Creation: 5/17/2021
 """
 import sys
 from pathlib import Path
-from karelcraft.karel_application import App
+from karelcraft.app_server import daemon_socket, submit
 """
 The following function definitions are defined as stubs so that IDEs can recognize
 the function definitions in student code. (Credits: stanford.karel module)
@@ -146,6 +146,18 @@ def remove_paint() -> None:
     pass
 
 
+def paint_region(cells, color: str) -> int:
+    pass
+
+
+def put_beepers(cells, counts=1) -> int:
+    pass
+
+
+def place_blocks(mask, block_texture: str) -> int:
+    pass
+
+
 def corner_color_is(color: str) -> bool:
     pass
 
@@ -166,6 +178,10 @@ def world_size() -> tuple:
     pass
 
 
+def get_observation(shared_name: str = None):
+    pass
+
+
 def reset(tuple) -> tuple:
     pass
 
@@ -174,7 +190,31 @@ def prompt(message: str) -> None:
     pass
 
 
-def run_karel_program(world_file: str = "") -> None:
+def run_karel_program(world_file: str = "", trace_file: str = None,
+                      replay_file: str = None, profile: bool = False,
+                      line_profile: str = None, line_profile_sample: int = 1,
+                      metrics_file: str = None, metrics_port: int = None) -> None:
+    """
+    Runs the calling student program in world_file; with a trace_file, each
+    run records the Karel functions it calls there, see
+    karelcraft.utils.action_trace, and a replay_file opens such a recording.
+    With profile, timings are printed on F9 and at exit, see
+    karelcraft.utils.profiler; with a line_profile file, each run prints
+    the lines that called the most Karel functions and writes its call
+    stacks there for flame graphs, see karelcraft.utils.line_profiler;
+    line_profile_sample=n only profiles every n-th call, for long runs.
+    metrics_file and/or metrics_port (on 127.0.0.1) publish throughput and
+    health metrics, see karelcraft.utils.metrics_export
+    """
     student_filename = Path(sys.argv[0])
-    app = App(student_filename, world_file)
+    # with $KARELCRAFT_DAEMON set, reuse a running app if there is one,
+    # otherwise this app becomes the daemon for the next runs
+    socket_path = daemon_socket()
+    if socket_path and submit(socket_path, student_filename, world_file):
+        return
+    from karelcraft.karel_application import App  # ursina is only loaded to run the app
+    app = App(student_filename, world_file, socket_path=socket_path, trace_file=trace_file,
+              replay_file=replay_file, profile=profile, line_profile=line_profile,
+              line_profile_sample=line_profile_sample, metrics_file=metrics_file,
+              metrics_port=metrics_port)
     app.run_program()
@@ -0,0 +1,275 @@
+"""
+Env server: hosts N headless worlds and steps them in batches over a Unix
+domain socket, so a learner never has to import ursina, e.g.
+
+    python -m karelcraft.rl.env_server --socket /tmp/karelcraft.sock \\
+        --worlds 11x11v2 --num-envs 64 --procs 4 --goal 5,10
+
+starts 4 server processes (/tmp/karelcraft.sock.0 ... .3) with 16 envs each,
+and EnvClient([...4 paths...]) drives all 64 envs as one batch.
+
+Framing, little-endian. Every message is a 5-byte header (opcode/status
+uint8, payload length uint32) followed by the payload:
+    INFO  -> num_envs uint32, observation shape 3 x uint32
+    RESET -> observations, rewards, dones
+    STEP  (num_envs x uint8 actions) -> observations, rewards, dones
+    CLOSE -> empty, the server exits
+observations are float32 (num_envs, C, rows, cols), rewards float32
+(num_envs,) and dones uint8 (num_envs,). Envs that finish are reset
+automatically, so their returned observation is the new start state.
+"""
+import argparse
+import os
+import socket
+import struct
+import time
+from multiprocessing import Process, active_children
+
+import numpy as np
+from karelcraft.rl.grid_env import ACTIONS, GridEnv
+from karelcraft.utils.observation import CHANNELS, DTYPE
+from karelcraft.utils.world_loader import WorldLoader
+
+HEADER = struct.Struct('<BI')
+INFO_REPLY = struct.Struct('<4I')
+OP_INFO, OP_RESET, OP_STEP, OP_CLOSE = range(4)
+STATUS_OK, STATUS_ERROR = range(2)
+
+
+def recv_exact(sock, view: memoryview) -> None:
+    '''
+    Fills view from the socket, straight into the caller's buffer
+    '''
+    while len(view):
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError('KarelCraft env server connection closed')
+        view = view[received:]
+
+
+def recv_message(sock) -> tuple:
+    header = bytearray(HEADER.size)
+    recv_exact(sock, memoryview(header))
+    code, length = HEADER.unpack(header)
+    payload = bytearray(length)
+    recv_exact(sock, memoryview(payload))
+    return code, payload
+
+
+class EnvServer:
+
+    def __init__(self, socket_path: str, world_files: list, seed: int = None,
+                 **env_kwargs) -> None:
+        self.socket_path = socket_path
+        self.num_envs = len(world_files)
+        world_loader = WorldLoader(world_files[0])
+        self.observations = np.zeros(
+            (self.num_envs, len(CHANNELS), world_loader.rows, world_loader.columns), DTYPE)
+        # every env writes its observations straight into its slice of the batch
+        self.envs = [
+            GridEnv(world_file, array=self.observations[i],
+                    seed=None if seed is None else seed + i, **env_kwargs)
+            for i, world_file in enumerate(world_files)
+        ]
+        self.rewards = np.zeros(self.num_envs, np.float32)
+        self.dones = np.zeros(self.num_envs, np.uint8)
+
+    def reset(self) -> None:
+        for env in self.envs:
+            env.reset()
+        self.rewards.fill(0)
+        self.dones.fill(0)
+
+    def step(self, actions) -> None:
+        for i, (env, action) in enumerate(zip(self.envs, actions)):
+            _, self.rewards[i], done = env.step(action)
+            self.dones[i] = done
+            if done:
+                env.reset()
+
+    def send(self, conn, status: int, *buffers) -> None:
+        length = sum(memoryview(b).nbytes for b in buffers)
+        conn.sendall(HEADER.pack(status, length))
+        for b in buffers:
+            conn.sendall(b)
+
+    def handle(self, conn) -> bool:
+        '''
+        Serves one connection; returns False once a CLOSE request arrives
+        '''
+        while True:
+            try:
+                op, payload = recv_message(conn)
+            except ConnectionError:
+                return True
+            try:
+                if op == OP_INFO:
+                    self.send(conn, STATUS_OK,
+                              INFO_REPLY.pack(self.num_envs, *self.observations.shape[1:]))
+                    continue
+                if op == OP_RESET:
+                    self.reset()
+                elif op == OP_STEP:
+                    if len(payload) != self.num_envs:
+                        raise ValueError(f'expected {self.num_envs} actions, got {len(payload)}')
+                    if max(payload) >= len(ACTIONS):
+                        raise ValueError(f'actions must be below {len(ACTIONS)}')
+                    self.step(payload)
+                elif op == OP_CLOSE:
+                    self.send(conn, STATUS_OK)
+                    return False
+                else:
+                    raise ValueError(f'unknown opcode {op}')
+                self.send(conn, STATUS_OK, self.observations, self.rewards, self.dones)
+            except Exception as e:
+                self.send(conn, STATUS_ERROR, str(e).encode())
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(1)
+        try:
+            serving = True
+            while serving:
+                conn, _ = server.accept()
+                with conn:
+                    serving = self.handle(conn)
+        finally:
+            server.close()
+            os.unlink(self.socket_path)
+
+
+def serve(socket_path: str, world_files: list, env_kwargs: dict) -> None:
+    EnvServer(socket_path, world_files, **env_kwargs).serve_forever()
+
+
+def launch_servers(socket_path: str, world_files: list, num_procs: int = 1,
+                   **env_kwargs) -> list:
+    '''
+    Splits world_files across num_procs server processes listening on
+    socket_path.0, socket_path.1, ...; returns the socket paths
+    '''
+    paths = []
+    for i in range(num_procs):
+        shard = world_files[i::num_procs]
+        if not shard:
+            break
+        path = f'{socket_path}.{i}'
+        Process(target=serve, args=(path, shard, env_kwargs), daemon=True).start()
+        paths.append(path)
+    return paths
+
+
+class EnvClient:
+    '''
+    Batched reset/step against one or more EnvServers, presented as one
+    vectorized env. Requests go out to every server before any reply is
+    read, so the servers step their shards in parallel.
+    '''
+
+    def __init__(self, socket_paths: list, timeout: float = 10.) -> None:
+        self.socks = [self._connect(path, timeout) for path in socket_paths]
+        self.shard_sizes = []
+        shape = None
+        for sock in self.socks:
+            num_envs, *obs_shape = INFO_REPLY.unpack(self._request(sock, OP_INFO))
+            if shape and tuple(obs_shape) != shape:
+                raise ValueError('Error: env servers host worlds of different sizes.')
+            shape = tuple(obs_shape)
+            self.shard_sizes.append(num_envs)
+        self.num_envs = sum(self.shard_sizes)
+        self.observations = np.zeros((self.num_envs,) + shape, DTYPE)
+        self.rewards = np.zeros(self.num_envs, np.float32)
+        self.dones = np.zeros(self.num_envs, np.uint8)
+        self.bounds = np.cumsum([0] + self.shard_sizes)
+
+    @staticmethod
+    def _connect(path: str, timeout: float):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        deadline = time.monotonic() + timeout
+        while True:  # the server process may still be starting
+            try:
+                sock.connect(path)
+                return sock
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.05)
+
+    @staticmethod
+    def _request(sock, op: int, payload: bytes = b'') -> bytearray:
+        sock.sendall(HEADER.pack(op, len(payload)) + payload)
+        status, reply = recv_message(sock)
+        if status != STATUS_OK:
+            raise RuntimeError(f'KarelCraft env server error: {reply.decode()}')
+        return reply
+
+    def _batch(self, op: int, actions=None) -> tuple:
+        if actions is not None:
+            actions = np.asarray(actions, np.uint8)
+            if actions.shape != (self.num_envs,):
+                raise ValueError(f'Error: expected {self.num_envs} actions, got {actions.shape}.')
+        for i, sock in enumerate(self.socks):
+            payload = b''
+            if actions is not None:
+                payload = actions[self.bounds[i]:self.bounds[i + 1]].tobytes()
+            sock.sendall(HEADER.pack(op, len(payload)) + payload)
+        errors = []
+        # read every reply, even after an error, to keep the streams in sync
+        for i, sock in enumerate(self.socks):
+            low, high = self.bounds[i], self.bounds[i + 1]
+            header = bytearray(HEADER.size)
+            recv_exact(sock, memoryview(header))
+            status, length = HEADER.unpack(header)
+            if status != STATUS_OK:
+                message = bytearray(length)
+                recv_exact(sock, memoryview(message))
+                errors.append(message.decode())
+                continue
+            for array in (self.observations, self.rewards, self.dones):
+                recv_exact(sock, memoryview(array[low:high]).cast('B'))
+        if errors:
+            raise RuntimeError(f'KarelCraft env server error: {"; ".join(errors)}')
+        return self.observations, self.rewards, self.dones
+
+    def reset(self) -> np.ndarray:
+        return self._batch(OP_RESET)[0]
+
+    def step(self, actions) -> tuple:
+        return self._batch(OP_STEP, actions)
+
+    def close(self, shutdown: bool = False) -> None:
+        for sock in self.socks:
+            if shutdown:
+                self._request(sock, OP_CLOSE)
+            sock.close()
+        self.socks = []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='KarelCraft batched env server')
+    parser.add_argument('--socket', default='/tmp/karelcraft.sock', help='socket path prefix')
+    parser.add_argument('--worlds', nargs='+', required=True, help='world files, e.g. 11x11v2')
+    parser.add_argument('--num-envs', type=int, default=None,
+                        help='total envs, cycling through --worlds')
+    parser.add_argument('--procs', type=int, default=1, help='number of server processes')
+    parser.add_argument('--goal', default=None, help='goal cell as col,row')
+    parser.add_argument('--random-start', action='store_true')
+    args = parser.parse_args()
+
+    num_envs = args.num_envs or len(args.worlds)
+    world_files = [args.worlds[i % len(args.worlds)] for i in range(num_envs)]
+    env_kwargs = {'random_start': args.random_start}
+    if args.goal:
+        env_kwargs['goal'] = tuple(int(v) for v in args.goal.split(','))
+    paths = launch_servers(args.socket, world_files, args.procs, **env_kwargs)
+    print(f'Serving {num_envs} envs with {len(CHANNELS)}-channel observations on:')
+    print('\n'.join(paths))
+    for process in active_children():
+        process.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Vectorized evaluation of greedy policies from trained Q-tables.
+
+All non-terminal starts are rolled out at once by pointer doubling on the
+policy's successor table, so one evaluation costs O(cells * log(cells))
+array ops, e.g.
+
+    python -m karelcraft.rl.evaluation simple_lava_env.py --world 11x11v2 \\
+        --q training/model/lava_q_values.npy
+"""
+import argparse
+from collections import deque
+
+import numpy as np
+from karelcraft.rl.headless import make_env
+
+# same order as the env scripts' actions: up, right, down, left (numpy convention)
+ACTION_DELTAS = np.array([(-1, 0), (0, 1), (1, 0), (0, -1)])
+
+
+class PolicyEvaluator:
+    '''
+    Scores Q-tables on a fixed reward grid. Transitions and BFS-optimal
+    path lengths are computed once, evaluate() is then cheap enough to run
+    after every training checkpoint.
+    '''
+
+    def __init__(self, rewards: np.ndarray, terminal: np.ndarray = None) -> None:
+        self.rows, self.cols = rewards.shape
+        self.num_cells = self.rows * self.cols
+        self.terminal = (rewards != -1.) if terminal is None else terminal
+        self.goal = self.terminal & (rewards > 0)
+        # successor of every cell for every action, clipped like the env scripts' step()
+        points = np.indices((self.rows, self.cols)).reshape(2, -1).T
+        moved = points[:, None, :] + ACTION_DELTAS[None, :, :]
+        moved[..., 0] = moved[..., 0].clip(0, self.rows - 1)
+        moved[..., 1] = moved[..., 1].clip(0, self.cols - 1)
+        self.transitions = moved[..., 0] * self.cols + moved[..., 1]  # (cells, actions)
+        self.starts = np.flatnonzero(~self.terminal.ravel())
+        self.optimal = self.shortest_paths()
+
+    def shortest_paths(self) -> np.ndarray:
+        '''
+        BFS from the goals through non-terminal cells; -1 where no goal is reachable
+        '''
+        rows, cols = self.rows, self.cols
+        dist = [-1] * self.num_cells  # plain lists, this loop is scalar work
+        blocked = self.terminal.ravel().tolist()
+        queue = deque(np.flatnonzero(self.goal.ravel()).tolist())
+        for cell in queue:
+            dist[cell] = 0
+        while queue:
+            cell = queue.popleft()
+            row, col = divmod(cell, cols)
+            neighbours = []
+            if row > 0:
+                neighbours.append(cell - cols)
+            if row < rows - 1:
+                neighbours.append(cell + cols)
+            if col > 0:
+                neighbours.append(cell - 1)
+            if col < cols - 1:
+                neighbours.append(cell + 1)
+            for prev in neighbours:
+                if dist[prev] < 0 and not blocked[prev]:
+                    dist[prev] = dist[cell] + 1
+                    queue.append(prev)
+        return np.array(dist)
+
+    def evaluate(self, q_values: np.ndarray) -> dict:
+        q_values = q_values.reshape(self.num_cells, -1)
+        policy = q_values.argmax(axis=1)
+        succ = self.transitions[np.arange(self.num_cells), policy]
+        terminal = self.terminal.ravel()
+        succ[terminal] = np.flatnonzero(terminal)  # terminals absorb
+        length = (~terminal).astype(np.int64)
+
+        # after k rounds succ jumps 2^k steps ahead and length counts them
+        for _ in range(int(np.ceil(np.log2(self.num_cells))) + 1):
+            length = length + length[succ]
+            succ = succ[succ]
+
+        end = succ[self.starts]
+        reached = terminal[end]
+        success = reached & self.goal.ravel()[end]
+        cycles = ~reached
+        optimal = self.optimal[self.starts]
+        solvable = optimal > 0
+        ratio_mask = success & solvable
+        num_starts = max(len(self.starts), 1)
+        return {
+            'starts': len(self.starts),
+            'success_rate': float(success.sum() / num_starts),
+            'failure_rate': float((reached & ~success).sum() / num_starts),
+            'cycle_rate': float(cycles.sum() / num_starts),
+            'mean_length': float(length[self.starts][success].mean()) if success.any() else 0.,
+            'mean_optimal': float(optimal[ratio_mask].mean()) if ratio_mask.any() else 0.,
+            'length_ratio': float((length[self.starts][ratio_mask] / optimal[ratio_mask]).mean())
+            if ratio_mask.any() else 0.,
+            'solvable_rate': float(solvable.sum() / num_starts),
+        }
+
+
+def env_evaluator(env) -> PolicyEvaluator:
+    '''
+    Builds an evaluator from an env script's reward grid and terminal states
+    '''
+    terminal = np.array([[env.is_terminal_state((r, c)) for c in range(env.cols)]
+                         for r in range(env.rows)])
+    return PolicyEvaluator(env.rewards, terminal)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Evaluate a trained KarelCraft Q-table')
+    parser.add_argument('script', help='env script, e.g. simple_lava_env.py')
+    parser.add_argument('--world', required=True, help='world file, e.g. 11x11v2')
+    parser.add_argument('--q', required=True, help='saved Q-table (.npy)')
+    args = parser.parse_args()
+
+    env = make_env(args.script, args.world)
+    report = env_evaluator(env).evaluate(np.load(args.q))
+    for key, value in report.items():
+        print(f'{key:>14}: {value:.3f}' if isinstance(value, float) else f'{key:>14}: {value}')
+
+
+if __name__ == '__main__':
+    main()
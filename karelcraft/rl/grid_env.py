@@ -0,0 +1,66 @@
+# Headless grid-navigation env built directly from a world file
+import random
+
+from karelcraft.utils.direction import Direction
+from karelcraft.utils.world_model import WorldModel
+
+# same action space as the env scripts: up, right, down, left
+ACTIONS = [Direction.NORTH, Direction.EAST, Direction.SOUTH, Direction.WEST]
+
+
+class GridEnv:
+    '''
+    Floor-is-lava style task on a WorldModel:
+    reaching a goal cell ends the episode with goal_reward, stepping on a
+    `hazard` block ends it with hazard_reward, every other step costs
+    step_reward. Goals default to the cells holding beepers.
+    Observations are the world's ObservationPlanes array (see
+    karelcraft.utils.observation), written in place.
+    '''
+
+    def __init__(self, world_file: str, goal: tuple = None, hazard: str = 'lava',
+                 step_reward: float = -1., goal_reward: float = 100.,
+                 hazard_reward: float = -100., random_start: bool = False,
+                 max_steps: int = 1000, array=None, seed: int = None) -> None:
+        self.model = WorldModel(world_file)
+        self.observation = self.model.enable_observation(array=array).array
+        self.hazard = hazard
+        self.step_reward = step_reward
+        self.goal_reward = goal_reward
+        self.hazard_reward = hazard_reward
+        self.random_start = random_start
+        self.max_steps = max_steps
+        self.rng = random.Random(seed)
+        if goal:
+            self.goals = {tuple(goal)}
+        else:
+            self.goals = {key for key, tokens in self.model.stacks.items() if 'b' in tokens}
+        self.steps = 0
+
+    def cell_reward(self, key) -> tuple:
+        if key in self.goals:
+            return self.goal_reward, True
+        if self.hazard and self.model.top_texture(key) == self.hazard:
+            return self.hazard_reward, True
+        return self.step_reward, False
+
+    def get_start_location(self) -> tuple:
+        if not self.random_start:
+            return self.model.world_loader.start_location
+        while True:
+            key = (self.rng.randrange(self.model.columns), self.rng.randrange(self.model.rows))
+            if not self.cell_reward(key)[1]:
+                return key
+
+    def reset(self):
+        self.model.reset(self.get_start_location())
+        self.steps = 0
+        return self.observation
+
+    def step(self, action_idx: int) -> tuple:
+        self.model.face(ACTIONS[action_idx])
+        if self.model.front_is_clear():
+            self.model.move()
+        self.steps += 1
+        reward, done = self.cell_reward(self.model.position)
+        return self.observation, reward, done or self.steps >= self.max_steps
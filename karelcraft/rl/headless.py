@@ -0,0 +1,35 @@
+# Loads the RL env scripts without opening a KarelCraft window
+import importlib.util
+import inspect
+from pathlib import Path
+
+from karelcraft.utils.world_loader import WorldLoader
+
+
+def load_env_module(script, world_file: str):
+    '''
+    Imports an env script (e.g. simple_lava_env.py) as a module and replaces
+    the Karel commands its env classes need outside of run_karel_program()
+    '''
+    world_loader = WorldLoader(world_file)
+    script = Path(script).resolve()
+    spec = importlib.util.spec_from_file_location(script.stem, script)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)  # type: ignore
+    mod.world_size = lambda: (world_loader.columns, world_loader.rows)
+    mod.prompt = lambda msg: None
+    return mod
+
+
+def find_env_class(mod):
+    '''
+    Returns the *Env class defined by an env script
+    '''
+    for name, obj in vars(mod).items():
+        if inspect.isclass(obj) and name.endswith('Env') and obj.__module__ == mod.__name__:
+            return obj
+    raise ValueError(f'Error: no *Env class found in {mod.__file__}.')
+
+
+def make_env(script, world_file: str):
+    return find_env_class(load_env_module(script, world_file))(render=False)
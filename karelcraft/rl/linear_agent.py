@@ -0,0 +1,190 @@
+# Linear function-approximation Q agent for worlds too large for Q-tables
+import random
+from pathlib import Path
+
+import numpy as np
+from karelcraft.rl.metrics import TrainingMetrics
+from karelcraft.rl.planning import greedy_action
+from karelcraft.utils.direction import Direction
+from karelcraft.utils.world_loader import TEXTURE_LIST
+
+# one-hot plane layout of grid_planes(), indexed [plane, row, col]
+PLANE_NAMES = ['outside', 'beeper', 'paint'] + \
+    [f'wall_{d.name.lower()}' for d in Direction] + \
+    [f'block_{t}' for t in TEXTURE_LIST]
+
+
+def grid_planes(world_loader) -> np.ndarray:
+    '''
+    Encodes a loaded world as uint8 one-hot planes in numpy convention,
+    i.e. (0, 0) at top left, so they line up with the env scripts' rewards
+    '''
+    rows, cols = world_loader.rows, world_loader.columns
+    planes = np.zeros((len(PLANE_NAMES), rows, cols), dtype=np.uint8)
+
+    def index(key) -> tuple:
+        return (rows - 1 - key[1], key[0])
+
+    for key, count in world_loader.beepers.items():
+        if count:
+            planes[(PLANE_NAMES.index('beeper'),) + index(key)] = 1
+    for key, color_name in world_loader.corner_colors.items():
+        if color_name:
+            planes[(PLANE_NAMES.index('paint'),) + index(key)] = 1
+    for key, (texture_name, count) in world_loader.blocks.items():
+        if count:
+            planes[(PLANE_NAMES.index('block_' + texture_name),) + index(key)] = 1
+    for wall in world_loader.walls:
+        plane = PLANE_NAMES.index('wall_' + wall.direction.name.lower())
+        planes[(plane,) + index((wall.col, wall.row))] = 1
+    for key, stack_string in world_loader.stack_strings.items():
+        for item in stack_string.split():
+            if item[0] == 'b':
+                planes[(PLANE_NAMES.index('beeper'),) + index(key)] = 1
+            elif item[0] == 'p':
+                planes[(PLANE_NAMES.index('paint'),) + index(key)] = 1
+            elif item[0] == 'v':
+                texture_name = TEXTURE_LIST[int(item[1:])]
+                planes[(PLANE_NAMES.index('block_' + texture_name),) + index(key)] = 1
+    return planes
+
+
+class LinearQAgent:
+    '''
+    Semi-gradient Q-learning with Q(s, a) = w_a . x(s), NumPy only.
+
+    x(s) concatenates a (2 * window + 1)^2 patch of the world's one-hot
+    planes around Karel with hashed tile coding of Karel's position, so the
+    number of weights depends on window, num_tilings and hash_size but
+    not on the size of the world.
+    '''
+
+    def __init__(self, env, planes: np.ndarray, window: int = 2, num_tilings: int = 8,
+                 tile_width: int = 4, hash_size: int = 4096) -> None:
+        self.env = env
+        self.env.render = False
+        self.num_actions = len(env.actions)
+        self.window = window
+        self.num_tilings = num_tilings
+        self.tile_width = tile_width
+        self.hash_size = hash_size
+        # pad once so every patch is a plain slice; padding counts as 'outside'
+        self.planes = np.pad(planes, ((0, 0), (window, window), (window, window)))
+        if window:  # [-0:] would be the whole axis
+            self.planes[0, :window] = self.planes[0, -window:] = 1
+            self.planes[0, :, :window] = self.planes[0, :, -window:] = 1
+        self.num_dense = self.planes.shape[0] * (2 * window + 1) ** 2
+        self.weights = np.zeros((self.num_actions, self.num_dense + hash_size), dtype=np.float32)
+
+    def dense_features(self, points: np.ndarray) -> np.ndarray:
+        '''
+        Plane patches around each (row, col) in points, shape (N, num_dense)
+        '''
+        span = 2 * self.window + 1
+        offsets = np.arange(span)
+        rows = points[:, 0, None] + offsets  # padded coordinates start at the patch corner
+        cols = points[:, 1, None] + offsets
+        patches = self.planes[:, rows[:, :, None], cols[:, None, :]]  # (P, N, span, span)
+        return patches.transpose(1, 0, 2, 3).reshape(len(points), -1).astype(np.float32)
+
+    def tile_indices(self, points: np.ndarray) -> np.ndarray:
+        '''
+        Hashed tile coding of (row, col), shape (N, num_tilings), offset by num_dense
+        '''
+        tilings = np.arange(self.num_tilings)
+        shift = tilings * self.tile_width // self.num_tilings
+        tile_rows = (points[:, 0, None] + shift) // self.tile_width
+        tile_cols = (points[:, 1, None] + shift) // self.tile_width
+        hashed = (tilings * 73856093) ^ (tile_rows * 19349663) ^ (tile_cols * 83492791)
+        return self.num_dense + hashed % self.hash_size
+
+    def features(self, points) -> tuple:
+        points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+        return self.dense_features(points), self.tile_indices(points)
+
+    def predict(self, dense, tiles) -> np.ndarray:
+        '''
+        Q-values for a batch of feature vectors, shape (N, num_actions)
+        '''
+        q = dense @ self.weights[:, :self.num_dense].T
+        return q + self.weights[:, tiles].sum(axis=-1).T
+
+    def q_row(self, point) -> np.ndarray:
+        return self.predict(*self.features([point]))[0]
+
+    def update(self, batch, discount_factor, learning_rate) -> float:
+        '''
+        One semi-gradient step over a batch of (point, action, reward, next_point, done)
+        and returns the largest |dQ| it applied
+        '''
+        points, actions, rewards, next_points, dones = (np.asarray(x) for x in zip(*batch))
+        dense, tiles = self.features(points)
+        next_q = self.predict(*self.features(next_points)).max(axis=1)
+        targets = rewards + discount_factor * next_q * (1 - dones)
+        td = targets - self.predict(dense, tiles)[np.arange(len(batch)), actions]
+        # normalise by the number of active features, like tile-coded Sarsa
+        step = learning_rate * td / (dense.sum(axis=1) + self.num_tilings)
+        np.add.at(self.weights[:, :self.num_dense], actions, step[:, None] * dense)
+        np.add.at(self.weights, (actions[:, None], tiles), step[:, None])
+        return float(np.abs(learning_rate * td).max())
+
+    def egreedy_policy(self, point, exploration_rate) -> int:
+        if random.random() < exploration_rate:
+            return random.randrange(self.num_actions)
+        return greedy_action(self.q_row(point))
+
+    def learn(self, num_episodes=2000, exploration_rate=0.1, discount_factor=0.9,
+              learning_rate=0.2, batch_size=32, min_delta_q=None, metrics=None,
+              max_steps=10000):
+        '''
+        exploration_rate - probability of taking a random action
+        discount_factor  - discount factor for future rewards
+        learning_rate - step size, split across the active features
+        batch_size - transitions collected per semi-gradient update
+        '''
+        metrics = metrics or TrainingMetrics(self.env.metrics_path, min_delta_q=min_delta_q)
+        batch = []
+        for i in range(num_episodes):
+            point = self.env.get_start_location()
+            self.env.agent_position = point
+            done = False
+            steps = 0
+            while not done and steps < max_steps:
+                action = self.egreedy_policy(point, exploration_rate)
+                next_point, reward, done = self.env.step(action)
+                batch.append((point, action, reward, next_point, float(done)))
+                delta_q = 0.
+                if len(batch) >= batch_size or done:
+                    delta_q = self.update(batch, discount_factor, learning_rate)
+                    batch = []
+                metrics.step(reward, delta_q)
+                point = next_point
+                steps += 1
+            if metrics.end_episode(i, exploration_rate):
+                print(f'Converged after {i + 1} episodes')
+                break
+        metrics.close()
+        print(metrics.summary())
+        return self.weights
+
+    def to_q_table(self) -> np.ndarray:
+        '''
+        Materialises a (rows, cols, actions) Q-table for play() on small worlds
+        '''
+        rows, cols = self.env.rows, self.env.cols
+        points = np.indices((rows, cols)).reshape(2, -1).T
+        return self.predict(*self.features(points)).reshape(rows, cols, -1)
+
+    def save(self, path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(path, weights=self.weights.astype(np.float16),
+                            config=np.array([self.window, self.num_tilings,
+                                             self.tile_width, self.hash_size]))
+
+    def load(self, path) -> None:
+        data = np.load(path)
+        config = tuple(int(v) for v in data['config'])
+        if config != (self.window, self.num_tilings, self.tile_width, self.hash_size):
+            raise ValueError(f'Error: {path} was trained with (window, num_tilings, '
+                             f'tile_width, hash_size) = {config}.')
+        self.weights = data['weights'].astype(np.float32)
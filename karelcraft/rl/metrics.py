@@ -0,0 +1,142 @@
+# Training telemetry for the RL env scripts
+import csv
+import io
+import json
+import os
+from collections import deque
+from pathlib import Path
+from time import perf_counter
+
+METRIC_FIELDS = ('episode', 'return', 'length', 'epsilon', 'max_delta_q', 'steps_per_sec')
+
+
+class TrainingMetrics:
+    '''
+    Lightweight per-episode metrics sink used by the env scripts' learn().
+
+    Records episode return, length, epsilon, max |dQ| and env steps/sec.
+    Rows are buffered in memory and written in batches to a CSV or JSONL
+    file (picked by suffix), which is rotated once it exceeds max_bytes.
+
+    Early stopping: when min_delta_q is set, end_episode() returns True
+    once max |dQ| stays below it for `patience` consecutive episodes.
+    '''
+
+    def __init__(self, log_path, buffer_size: int = 100,
+                 max_bytes: int = 10 * 1024 * 1024, backup_count: int = 3,
+                 min_delta_q: float = None, patience: int = 10) -> None:
+        self.log_path = Path(log_path)
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        self.use_json = self.log_path.suffix == '.jsonl'
+        self.buffer_size = buffer_size
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.min_delta_q = min_delta_q
+        self.patience = patience
+        self.buffer = []
+        self.episodes = 0
+        self.total_steps = 0
+        self.total_time = 0.
+        self.calm_episodes = 0  # consecutive episodes below min_delta_q
+        self.recent_returns = deque(maxlen=100)
+        self.last_row = None
+        self.start_episode()
+
+    def start_episode(self) -> None:
+        self.episode_return = 0.
+        self.episode_length = 0
+        self.max_delta_q = 0.
+        self.episode_start = perf_counter()
+
+    def step(self, reward, delta_q) -> None:
+        '''
+        Accumulates one environment step; delta_q is the applied Q update
+        '''
+        self.episode_return += reward
+        self.episode_length += 1
+        delta_q = abs(delta_q)
+        if delta_q > self.max_delta_q:
+            self.max_delta_q = delta_q
+
+    def end_episode(self, episode, epsilon) -> bool:
+        '''
+        Closes the current episode and returns True if training has converged
+        '''
+        elapsed = perf_counter() - self.episode_start
+        self.total_steps += self.episode_length
+        self.total_time += elapsed
+        self.episodes += 1
+        row = (episode, float(self.episode_return), self.episode_length, epsilon,
+               float(self.max_delta_q), self.episode_length / elapsed if elapsed else 0.)
+        self.buffer.append(row)
+        self.last_row = row
+        self.recent_returns.append(row[1])
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+        converged = False
+        if self.min_delta_q is not None:
+            if self.max_delta_q < self.min_delta_q:
+                self.calm_episodes += 1
+            else:
+                self.calm_episodes = 0
+            converged = self.calm_episodes >= self.patience
+        self.start_episode()
+        return converged
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        self.rotate()
+        is_new = not self.log_path.is_file() or self.log_path.stat().st_size == 0
+        text = io.StringIO()
+        if self.use_json:
+            for row in self.buffer:
+                text.write(json.dumps(dict(zip(METRIC_FIELDS, row))) + '\n')
+        else:
+            writer = csv.writer(text)
+            if is_new:
+                writer.writerow(METRIC_FIELDS)
+            writer.writerows(self.buffer)
+        with open(self.log_path, 'a', newline='') as f:
+            f.write(text.getvalue())
+        self.buffer.clear()
+
+    def rotate(self) -> None:
+        '''
+        Shifts log -> log.1 -> log.2 ... once the log exceeds max_bytes
+        '''
+        if not self.log_path.is_file() or self.log_path.stat().st_size < self.max_bytes:
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            src = Path(f'{self.log_path}.{i}')
+            if src.is_file():
+                os.replace(src, f'{self.log_path}.{i + 1}')
+        if self.backup_count > 0:
+            os.replace(self.log_path, f'{self.log_path}.1')
+        else:
+            self.log_path.unlink()
+
+    def close(self) -> None:
+        self.flush()
+
+    def mean_return(self) -> float:
+        '''
+        Mean return over the last (up to) 100 episodes
+        '''
+        if not self.recent_returns:
+            return 0.
+        return sum(self.recent_returns) / len(self.recent_returns)
+
+    def summary(self) -> str:
+        steps_per_sec = self.total_steps / self.total_time if self.total_time else 0.
+        msg = f'{self.episodes} episodes, {self.total_steps} steps, {steps_per_sec:.0f} steps/sec'
+        if self.last_row:
+            msg += f', last return {self.last_row[1]:.1f}, max |dQ| {self.last_row[4]:.3g}'
+        return msg
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,166 @@
+# Planning-augmented tabular learners: Dyna-Q and prioritized sweeping
+import heapq
+import random
+from collections import defaultdict
+
+import numpy as np
+from karelcraft.rl.metrics import TrainingMetrics
+
+
+def start_state(env):
+    '''
+    Resets the env to its start location and returns the Q-table index for it.
+    Envs with a flat Q-table (e.g. CliffEnv) expose vec2id() for the mapping.
+    '''
+    point = env.get_start_location()
+    env.agent_position = point
+    if hasattr(env, 'vec2id'):
+        return env.vec2id(point)
+    return tuple(point)
+
+
+def greedy_action(q_row) -> int:
+    '''
+    argmax with random tie-breaking, so untrained states are not always 'up'
+    '''
+    best = np.flatnonzero(q_row == q_row.max())
+    return int(best[0]) if len(best) == 1 else int(random.choice(best))
+
+
+class DynaQ:
+    '''
+    Tabular Dyna-Q on top of the env scripts' headless step().
+
+    Every real transition updates env.q_values and a deterministic model of
+    the world; planning_steps simulated transitions are then replayed from
+    the model. The Q-table is shared with the env, so the usual np.save()
+    and play() work unchanged.
+    '''
+
+    def __init__(self, env, planning_steps: int = 30) -> None:
+        self.env = env
+        self.env.render = False
+        self.planning_steps = planning_steps
+        self.q_values = env.q_values
+        self.num_actions = len(env.actions)
+        self.model: dict = {}  # (state, action) -> (reward, next_state, done)
+        self.visited: list = []  # model keys, for O(1) random sampling
+
+    def egreedy_policy(self, state, exploration_rate) -> int:
+        if random.random() < exploration_rate:
+            return random.randrange(self.num_actions)
+        return greedy_action(self.q_values[state])
+
+    def td_error(self, state, action, reward, next_state, done, discount_factor) -> float:
+        target = reward
+        if not done:
+            target += discount_factor * np.max(self.q_values[next_state])
+        return target - self.q_values[state][action]
+
+    def update_model(self, state, action, reward, next_state, done) -> None:
+        key = (state, action)
+        if key not in self.model:
+            self.visited.append(key)
+        self.model[key] = (reward, next_state, done)
+
+    def plan(self, discount_factor, learning_rate) -> None:
+        for _ in range(self.planning_steps):
+            state, action = random.choice(self.visited)
+            reward, next_state, done = self.model[(state, action)]
+            self.q_values[state][action] += learning_rate * \
+                self.td_error(state, action, reward, next_state, done, discount_factor)
+
+    def observe(self, state, action, reward, next_state, done,
+                discount_factor, learning_rate) -> float:
+        '''
+        Learns from one real transition and returns the applied Q update
+        '''
+        delta_q = learning_rate * self.td_error(state, action, reward, next_state, done,
+                                                discount_factor)
+        self.q_values[state][action] += delta_q
+        self.update_model(state, action, reward, next_state, done)
+        self.plan(discount_factor, learning_rate)
+        return delta_q
+
+    def learn(self, num_episodes=200, exploration_rate=0.1, discount_factor=0.9,
+              learning_rate=0.9, min_delta_q=None, metrics=None, max_steps=10000):
+        '''
+        exploration_rate - probability of taking a random action
+        discount_factor  - discount factor for future rewards
+        learning_rate - the rate at which the AI agent should learn
+        min_delta_q - stop early once max |dQ| per episode stays below this
+        '''
+        metrics = metrics or TrainingMetrics(self.env.metrics_path, min_delta_q=min_delta_q)
+        for i in range(num_episodes):
+            state = start_state(self.env)
+            done = False
+            steps = 0
+            while not done and steps < max_steps:
+                action = self.egreedy_policy(state, exploration_rate)
+                next_state, reward, done = self.env.step(action)
+                if not isinstance(next_state, (int, np.integer)):
+                    next_state = tuple(next_state)
+                delta_q = self.observe(state, action, reward, next_state, done,
+                                       discount_factor, learning_rate)
+                metrics.step(reward, delta_q)
+                state = next_state
+                steps += 1
+            if metrics.end_episode(i, exploration_rate):
+                print(f'Converged after {i + 1} episodes')
+                break
+        metrics.close()
+        print(metrics.summary())
+        return self.q_values
+
+
+class PrioritizedSweeping(DynaQ):
+    '''
+    Dyna-Q variant whose planning backups are drawn from a priority queue
+    keyed on |TD error|, propagating changes backwards through predecessors.
+    '''
+
+    def __init__(self, env, planning_steps: int = 30, theta: float = 1e-4) -> None:
+        super().__init__(env, planning_steps)
+        self.theta = theta
+        self.queue: list = []
+        self.counter = 0  # tie-breaker, states are not always comparable
+        self.predecessors = defaultdict(set)
+
+    def push(self, state, action, priority) -> None:
+        if priority > self.theta:
+            self.counter += 1
+            heapq.heappush(self.queue, (-priority, self.counter, state, action))
+
+    def update_model(self, state, action, reward, next_state, done) -> None:
+        super().update_model(state, action, reward, next_state, done)
+        self.predecessors[next_state].add((state, action))
+
+    def plan(self, discount_factor, learning_rate) -> None:
+        for _ in range(self.planning_steps):
+            if not self.queue:
+                return
+            _, _, state, action = heapq.heappop(self.queue)
+            reward, next_state, done = self.model[(state, action)]
+            self.q_values[state][action] += learning_rate * \
+                self.td_error(state, action, reward, next_state, done, discount_factor)
+            for prev_state, prev_action in self.predecessors[state]:
+                prev_reward, _, prev_done = self.model[(prev_state, prev_action)]
+                priority = abs(self.td_error(prev_state, prev_action, prev_reward, state,
+                                             prev_done, discount_factor))
+                self.push(prev_state, prev_action, priority)
+
+    def observe(self, state, action, reward, next_state, done,
+                discount_factor, learning_rate) -> float:
+        error = self.td_error(state, action, reward, next_state, done, discount_factor)
+        delta_q = learning_rate * error
+        self.q_values[state][action] += delta_q
+        self.update_model(state, action, reward, next_state, done)
+        # the real update above already applied most of the error
+        self.push(state, action, abs(error - delta_q))
+        for prev_state, prev_action in self.predecessors[state]:
+            prev_reward, _, prev_done = self.model[(prev_state, prev_action)]
+            priority = abs(self.td_error(prev_state, prev_action, prev_reward, state,
+                                         prev_done, discount_factor))
+            self.push(prev_state, prev_action, priority)
+        self.plan(discount_factor, learning_rate)
+        return delta_q
@@ -0,0 +1,183 @@
+"""
+Hyperparameter sweep runner for the RL env scripts.
+
+Fans headless learn() runs out across a process pool and collects their
+metrics into one results table, e.g.
+
+    python -m karelcraft.rl.sweep simple_lava_env.py --worlds 11x11v2 \\
+        --param learning_rate=0.1,0.5,0.9 --param epsilon=0.7,0.8,0.9 \\
+        --param num_episodes=500 --seeds 4
+
+Values written as lo:hi are sampled uniformly with --random N.
+"""
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from time import perf_counter, strftime
+
+import numpy as np
+from karelcraft.rl.evaluation import env_evaluator
+from karelcraft.rl.headless import make_env
+from karelcraft.rl.metrics import TrainingMetrics
+from karelcraft.utils.world_loader import WorldLoader
+
+SWEEP_DIR = os.path.join('training', 'sweeps')
+
+
+def parse_value(text: str):
+    for cast in (int, float):
+        try:
+            return cast(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_param(spec: str) -> tuple:
+    '''
+    'name=a,b,c' -> (name, [a, b, c]); 'name=lo:hi' -> (name, (lo, hi))
+    '''
+    name, _, values = spec.partition('=')
+    if not values:
+        raise ValueError(f'Error: {spec} is an invalid parameter, expected name=values.')
+    if ':' in values:
+        low, high = values.split(':')
+        return name, (float(low), float(high))
+    return name, [parse_value(v) for v in values.split(',')]
+
+
+def grid_configs(space: dict) -> list:
+    for name, values in space.items():
+        if isinstance(values, tuple):
+            raise ValueError(f'Error: range {name}={values[0]}:{values[1]} needs --random.')
+    names = list(space)
+    return [dict(zip(names, combo)) for combo in itertools.product(*space.values())]
+
+
+def random_configs(space: dict, num_configs: int, rng: random.Random) -> list:
+    configs = []
+    for _ in range(num_configs):
+        config = {}
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                config[name] = round(rng.uniform(*values), 4)
+            else:
+                config[name] = rng.choice(values)
+        configs.append(config)
+    return configs
+
+
+def run_config(script, world_file, config, seed, run_dir, min_delta_q) -> dict:
+    '''
+    One headless training run, executed in a worker process
+    '''
+    Path(run_dir).mkdir(parents=True, exist_ok=True)
+    os.chdir(run_dir)  # env scripts save models relative to the cwd
+    np.random.seed(seed)
+    random.seed(seed)
+    env = make_env(script, world_file)
+    metrics = TrainingMetrics('metrics.csv', min_delta_q=min_delta_q)
+    start = perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        env.learn(metrics=metrics, **config)
+    report = env_evaluator(env).evaluate(env.q_values)
+    return {
+        'world': Path(world_file).stem,
+        'seed': seed,
+        **config,
+        'episodes': metrics.episodes,
+        'steps': metrics.total_steps,
+        'seconds': round(perf_counter() - start, 3),
+        'mean_return': round(metrics.mean_return(), 3),
+        'success_rate': round(report['success_rate'], 3),
+        'cycle_rate': round(report['cycle_rate'], 3),
+        'length_ratio': round(report['length_ratio'], 3),
+        'run_dir': run_dir,
+    }
+
+
+def best_per_world(results: list, param_names: list) -> dict:
+    '''
+    Averages seeds per (world, config) and keeps the highest greedy success
+    rate, breaking ties by mean return and then by fewer env steps
+    '''
+    groups = {}
+    for row in results:
+        key = (row['world'],) + tuple(row[name] for name in param_names)
+        groups.setdefault(key, []).append(row)
+    best = {}
+    for key, rows in groups.items():
+        score = (np.mean([r['success_rate'] for r in rows]),
+                 np.mean([r['mean_return'] for r in rows]),
+                 -np.mean([r['steps'] for r in rows]))
+        if key[0] not in best or score > best[key[0]][0]:
+            best[key[0]] = (score, dict(zip(param_names, key[1:])))
+    return {world: (config, score) for world, (score, config) in best.items()}
+
+
+def sweep(script, worlds, space: dict, seeds, num_random=0, workers=None,
+          min_delta_q=None, out_dir=None) -> list:
+    out_dir = Path(out_dir or os.path.join(SWEEP_DIR, strftime('%Y%m%d-%H%M%S'))).resolve()
+    rng = random.Random(0)
+    configs = random_configs(space, num_random, rng) if num_random else grid_configs(space)
+    script = str(Path(script).resolve())
+    # resolve worlds here, the workers run from their own run directories
+    world_files = [str(WorldLoader(w).world_file.resolve().with_suffix('')) for w in worlds]
+    tasks = [(world_file, config, seed)
+             for world_file in world_files for config in configs for seed in seeds]
+    print(f'Sweeping {len(configs)} configs x {len(seeds)} seeds x {len(worlds)} worlds '
+          f'= {len(tasks)} runs')
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(run_config, script, world_file, config, seed,
+                        str(out_dir / f'run_{i:04d}'), min_delta_q)
+            for i, (world_file, config, seed) in enumerate(tasks)
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+            print(f'\r{len(results)}/{len(tasks)} runs done', end='', flush=True)
+    print()
+
+    results.sort(key=lambda r: r['run_dir'])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / 'results.csv', 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    print(f'Results saved to {out_dir / "results.csv"}')
+
+    for world, (config, score) in best_per_world(results, list(space)).items():
+        success_rate, mean_return, neg_steps = score
+        print(f'Best on {world}: {config} => success {success_rate:.0%}, '
+              f'mean return {mean_return:.2f}, {-neg_steps:.0f} steps')
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Hyperparameter sweep for KarelCraft env scripts')
+    parser.add_argument('script', help='env script, e.g. simple_lava_env.py')
+    parser.add_argument('--worlds', nargs='+', required=True, help='world files, e.g. 11x11v2')
+    parser.add_argument('--param', action='append', default=[],
+                        help='learn() parameter as name=a,b,c or name=lo:hi')
+    parser.add_argument('--seeds', type=int, default=1, help='number of seeds per config')
+    parser.add_argument('--random', type=int, default=0, help='random search with N configs')
+    parser.add_argument('--workers', type=int, default=None, help='process pool size')
+    parser.add_argument('--min-delta-q', type=float, default=None, help='early stopping threshold')
+    parser.add_argument('--out', default=None, help='output directory')
+    args = parser.parse_args()
+
+    space = dict(parse_param(p) for p in args.param)
+    sweep(args.script, args.worlds, space, list(range(args.seeds)), args.random,
+          args.workers, args.min_delta_q, args.out)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# Paces student actions at a rate in actions per second without blocking
+import math
+from time import perf_counter
+
+MIN_RATE = 0.5  # actions per second
+MAX_RATE = 100_000
+MAX_LAG = 0.1  # seconds of actions that may be caught up after a slow frame
+TWEEN_RATE = 30  # above this rate moves jump instead of gliding
+
+
+def speed_to_rate(speed: float) -> float:
+    '''
+    Actions per second of a world file speed: values up to 1 are the old
+    slider setting, a delay of 1 - speed seconds per action; larger
+    values are actions per second
+    '''
+    if speed > 1:
+        rate = speed
+    elif speed < 1:
+        rate = 1 / (1 - max(speed, 0))
+    else:
+        rate = MAX_RATE
+    return min(max(rate, MIN_RATE), MAX_RATE)
+
+
+def slider_to_rate(value: float) -> float:
+    '''
+    Exponential slider: equal slider steps multiply the rate by the same factor
+    '''
+    return MIN_RATE * (MAX_RATE / MIN_RATE) ** min(max(value, 0), 1)
+
+
+def rate_to_slider(rate: float) -> float:
+    return math.log(rate / MIN_RATE) / math.log(MAX_RATE / MIN_RATE)
+
+
+def rate_text(rate: float) -> str:
+    if rate >= 1000:
+        return f'{rate / 1000:.3g}k/s'
+    return f'{rate:.2g}/s'
+
+
+def tween_duration(rate: float) -> float:
+    '''
+    Seconds Karel takes to glide to the next cell, 0 to jump
+    '''
+    return 1 / rate if rate <= TWEEN_RATE else 0
+
+
+class ActionScheduler:
+    '''
+    Credits actions over time: each frame tick() adds elapsed seconds x rate,
+    and each action spends one credit, so the pace does not depend on the
+    frame rate and nothing ever sleeps
+    '''
+
+    def __init__(self, rate: float) -> None:
+        self.rate = rate
+        self.credit = 0.0
+        self.last = perf_counter()
+
+    def start(self) -> None:
+        self.credit = 1.0  # the first action runs right away
+        self.last = perf_counter()
+
+    def tick(self) -> None:
+        now = perf_counter()
+        self.credit = min(self.credit + (now - self.last) * self.rate,
+                          max(1.0, self.rate * MAX_LAG))
+        self.last = now
+
+    def ready(self) -> bool:
+        return self.credit >= 1
+
+    def spend(self) -> None:
+        self.credit -= 1
@@ -0,0 +1,246 @@
+"""
+Compact binary trace of the Karel functions a program called, e.g.
+
+    run_karel_program('11x11', trace_file='run.trace')
+
+writes run.trace and its index run.trace.idx; TraceReader reads them back.
+
+Trace file, little-endian:
+    header  b'KCTR', version uint8, world file and opcode names as
+            uint16-length-prefixed utf-8 strings (names comma separated)
+    records opcode uint8 = index into the names | FLAG_HASH | FLAG_FAILED,
+            then, depending on the function:
+                paint_corner, corner_color_is : uint8 index into COLOR_LIST
+                put_block                     : uint8 index into TEXTURE_LIST
+                reset                         : uint8 1 if a position follows,
+                                                then col, row as 2 x uint16
+                paint_region, place_blocks,   : uint8 color/texture index
+                put_beepers                     (UNKNOWN for put_beepers),
+                                                uint32 n, then col, row, count
+                                                as n x 3 x uint16
+            then, with FLAG_HASH, the uint32 state_hash() after the call
+Most records are a single byte, so 10M steps take a few tens of MB.
+The index holds the uint64 file offset of every INDEX_INTERVAL-th record,
+so reading from step K only decodes the K % INDEX_INTERVAL records before it.
+"""
+import struct
+import zlib
+from array import array
+from pathlib import Path
+from typing import NamedTuple
+
+from karelcraft.utils.helpers import cell_counts, mask_counts
+from karelcraft.utils.student_code import KAREL_FUNCTIONS
+from karelcraft.utils.world_loader import COLOR_LIST, TEXTURE_LIST
+
+MAGIC = b'KCTR'
+VERSION = 1
+INDEX_INTERVAL = 4096
+HASH_INTERVAL = 256  # steps between state hashes, 0 for none
+BUFFER_SIZE = 1 << 20
+FLAG_HASH = 0x80
+FLAG_FAILED = 0x40  # the call raised, e.g. a KarelException
+OPCODE_MASK = 0x3f
+UNKNOWN = 0xff  # argument outside COLOR_LIST/TEXTURE_LIST
+
+LENGTH = struct.Struct('<H')
+POSITION = struct.Struct('<HH')
+HASH = struct.Struct('<I')
+COUNT = struct.Struct('<I')
+CELL = struct.Struct('<HHH')
+OFFSET_TYPE = 'Q'
+
+COLOR_ARGS = ('paint_corner', 'corner_color_is')
+TEXTURE_ARGS = ('put_block',)
+BATCH_ARGS = {'paint_region': COLOR_LIST, 'put_beepers': None, 'place_blocks': TEXTURE_LIST}
+
+
+class Record(NamedTuple):
+    step: int
+    name: str
+    arg: object  # color or texture name, reset position, batch args tuple, or None
+    state_hash: int
+    failed: bool
+
+
+def state_hash(position: tuple, direction_name: str, num_beepers: int,
+               stack_string: str) -> int:
+    '''
+    Cheap fingerprint of Karel's pose, bag and the stack under Karel; the
+    app and a WorldModel replay compute the same value for the same state
+    '''
+    state = f'{position[0]},{position[1]},{direction_name},{num_beepers},{stack_string}'
+    return zlib.crc32(state.encode())
+
+
+def _batch_cells(name: str, args: tuple) -> dict:
+    '''
+    {(col, row): count} of the cells a batch function was called with
+    '''
+    if name == 'place_blocks':
+        return mask_counts(args[0])
+    if name == 'put_beepers':
+        return cell_counts(args[0], *args[1:2])
+    return cell_counts(args[0])
+
+
+def _pack_batch(name: str, args: tuple) -> bytes:
+    names = BATCH_ARGS[name]
+    arg = args[1] if names and len(args) > 1 else None
+    data = bytearray((names.index(arg) if names and arg in names else UNKNOWN,))
+    try:
+        cells = b''.join(CELL.pack(key[0], key[1], count)
+                         for key, count in _batch_cells(name, args).items())
+    except (ValueError, TypeError, IndexError, struct.error):
+        cells = b''  # invalid arguments, the call failed
+    return bytes(data + COUNT.pack(len(cells) // CELL.size) + cells)
+
+
+def _unpack_batch(name: str, file) -> tuple:
+    names = BATCH_ARGS[name]
+    idx = file.read(1)[0]
+    n, = COUNT.unpack(file.read(COUNT.size))
+    cells = list(CELL.iter_unpack(file.read(n * CELL.size)))
+    keys = [(col, row) for col, row, _ in cells]
+    if name == 'put_beepers':
+        return keys, [count for _, _, count in cells]
+    arg = names[idx] if idx < len(names) else None
+    if name == 'place_blocks':
+        return {(col, row): count for col, row, count in cells}, arg
+    return keys, arg
+
+
+def index_path(path) -> Path:
+    path = Path(path)
+    return path.with_name(path.name + '.idx')
+
+
+def _write_string(file, text: str) -> int:
+    data = text.encode()
+    file.write(LENGTH.pack(len(data)) + data)
+    return LENGTH.size + len(data)
+
+
+def _read_string(file) -> str:
+    length, = LENGTH.unpack(file.read(LENGTH.size))
+    return file.read(length).decode()
+
+
+class TraceWriter:
+    '''
+    Streams records to disk through a large write buffer
+    '''
+
+    def __init__(self, path, world_file: str = '',
+                 hash_interval: int = HASH_INTERVAL) -> None:
+        self.path = Path(path)
+        self.names = list(KAREL_FUNCTIONS)
+        self.opcodes = {name: idx for idx, name in enumerate(self.names)}
+        self.hash_interval = hash_interval
+        self.file = open(self.path, 'wb', buffering=BUFFER_SIZE)
+        self.index = open(index_path(self.path), 'wb')
+        self.file.write(MAGIC + bytes((VERSION,)))
+        self.offset = len(MAGIC) + 1
+        self.offset += _write_string(self.file, str(world_file))
+        self.offset += _write_string(self.file, ','.join(self.names))
+        self.steps = 0
+
+    @property
+    def hash_due(self) -> bool:
+        '''
+        Whether the next record should carry a state hash
+        '''
+        return self.hash_interval > 0 and self.steps % self.hash_interval == 0
+
+    def record(self, name: str, args: tuple = (), state: int = None,
+               failed: bool = False) -> None:
+        if self.steps % INDEX_INTERVAL == 0:
+            self.index.write(struct.pack('<' + OFFSET_TYPE, self.offset))
+        opcode = self.opcodes[name]
+        if state is not None:
+            opcode |= FLAG_HASH
+        if failed:
+            opcode |= FLAG_FAILED
+        data = bytearray((opcode,))
+        if name in COLOR_ARGS or name in TEXTURE_ARGS:
+            names = COLOR_LIST if name in COLOR_ARGS else TEXTURE_LIST
+            arg = args[0] if args else None
+            data.append(names.index(arg) if arg in names else UNKNOWN)
+        elif name == 'reset':
+            position = args[0] if args else None
+            data.append(position is not None)
+            if position is not None:
+                data += POSITION.pack(int(position[0]), int(position[1]))
+        elif name in BATCH_ARGS:
+            data += _pack_batch(name, args)
+        if state is not None:
+            data += HASH.pack(state)
+        self.file.write(data)
+        self.offset += len(data)
+        self.steps += 1
+
+    def close(self) -> None:
+        self.file.close()
+        self.index.close()
+
+
+class TraceReader:
+
+    def __init__(self, path) -> None:
+        self.path = Path(path)
+        self.file = open(self.path, 'rb', buffering=BUFFER_SIZE)
+        if self.file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'Error: {self.path} is not a KarelCraft trace.')
+        version = self.file.read(1)[0]
+        if version != VERSION:
+            raise ValueError(f'Error: unsupported trace version {version}.')
+        self.world_file = _read_string(self.file)
+        self.names = _read_string(self.file).split(',')
+        self.offsets = array(OFFSET_TYPE)
+        self.offsets.frombytes(index_path(self.path).read_bytes())
+        self.steps = 0
+        if self.offsets:  # only the records after the last indexed one are counted
+            self.steps = (len(self.offsets) - 1) * INDEX_INTERVAL
+            self.steps += sum(1 for _ in self.records(self.steps))
+
+    def __len__(self) -> int:
+        return self.steps
+
+    def records(self, start: int = 0):
+        '''
+        Yields the records from step start on
+        '''
+        block = start // INDEX_INTERVAL
+        if block >= len(self.offsets):
+            return
+        self.file.seek(self.offsets[block])
+        step = block * INDEX_INTERVAL
+        while True:
+            record = self._read_record(step)
+            if record is None:
+                return
+            if step >= start:
+                yield record
+            step += 1
+
+    def _read_record(self, step: int) -> Record:
+        data = self.file.read(1)
+        if not data:
+            return None
+        name = self.names[data[0] & OPCODE_MASK]
+        arg = None
+        if name in COLOR_ARGS or name in TEXTURE_ARGS:
+            names = COLOR_LIST if name in COLOR_ARGS else TEXTURE_LIST
+            idx = self.file.read(1)[0]
+            arg = names[idx] if idx < len(names) else None
+        elif name == 'reset' and self.file.read(1)[0]:
+            arg = POSITION.unpack(self.file.read(POSITION.size))
+        elif name in BATCH_ARGS:
+            arg = _unpack_batch(name, self.file)
+        state = None
+        if data[0] & FLAG_HASH:
+            state, = HASH.unpack(self.file.read(HASH.size))
+        return Record(step, name, arg, state, bool(data[0] & FLAG_FAILED))
+
+    def close(self) -> None:
+        self.file.close()
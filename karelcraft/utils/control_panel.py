@@ -2,6 +2,8 @@ from ursina import *
 from karelcraft.entities.cog_menu import CogMenu
 from karelcraft.entities.radial_menu import RadialMenu, RadialMenuButton
 from karelcraft.entities.dropdown_menu import DropdownMenu, DropdownMenuButton
+from karelcraft.entities.latest_text import LatestText
+from karelcraft.utils.action_scheduler import rate_to_slider, rate_text
 
 TITLE = 'KarelCraft'
 
@@ -54,6 +56,30 @@ class ControlPanel:
         self.reset_button.text_entity.scale = 0.7
         self.reset_button.tooltip = Tooltip('Reset the world')
 
+        # Step back/forward buttons:
+        self.back_button = Button(
+            model='circle',
+            position=(-0.79, 0.04),
+            text='<',
+            color=color.gray,
+            pressed_color=color.azure,
+            parent=camera.ui,
+            eternal=True,
+            scale=0.048,
+        )
+        self.back_button.tooltip = Tooltip('Step back [z]')
+        self.next_button = Button(
+            model='circle',
+            position=(-0.71, 0.04),
+            text='>',
+            color=color.gray,
+            pressed_color=color.azure,
+            parent=camera.ui,
+            eternal=True,
+            scale=0.048,
+        )
+        self.next_button.tooltip = Tooltip('Step forward [y]')
+
     def setup_menu(self, func_dict) -> None:
         self.menu = CogMenu(func_dict)
         self.menu.on_click = Func(setattr, self.menu, 'enabled', False)
@@ -72,10 +98,10 @@ class ControlPanel:
         self.view_button.scale *= 0.85
 
     def set_speed_control(self, world_speed) -> None:
-        # Slider
+        # Slider, exponential in actions per second, see slider_to_rate()
         self.speed_slider = ThinSlider(0.0, 1.0,
-                                       default=world_speed,
-                                       step=0.02,
+                                       default=rate_to_slider(world_speed),
+                                       step=0.01,
                                        text='Speed',
                                        dynamic=True,
                                        position=(-0.75, -0.4),
@@ -86,6 +112,30 @@ class ControlPanel:
         self.speed_slider.scale *= 0.85
         self.speed_slider.bg.color = color.white66
         self.speed_slider.knob.color = color.green
+        self.show_speed(world_speed)
+
+    def show_speed(self, rate) -> None:
+        self.speed_slider.knob.text_entity.text = rate_text(rate)
+
+    def set_replay_control(self, num_steps, show_step) -> None:
+        # Slider scrubbing through the steps of a recorded run
+        if getattr(self, 'replay_slider', None):
+            destroy(self.replay_slider)
+        self.replay_slider = Slider(0, max(num_steps, 1),
+                                    default=0,
+                                    step=1,
+                                    text='Step',
+                                    dynamic=True,
+                                    position=(-0.3, 0.4),
+                                    parent=camera.ui,
+                                    eternal=True,
+                                    )
+        self.replay_slider.on_value_changed = lambda: show_step(self.replay_slider.value)
+
+    def close_replay_control(self) -> None:
+        if getattr(self, 'replay_slider', None):
+            destroy(self.replay_slider)
+            self.replay_slider = None
 
     def world_selector(self, world_list, load_world) -> None:
         # world selector:
@@ -124,18 +174,19 @@ class ControlPanel:
              eternal=True,
              )
         msg = f'Position : {agent_position}; Direction: {direction_name}'
-        self.prompt = Text(msg,
-                           position=center + Vec2(-0.36, -0.43),
-                           scale=1,
-                           parent=camera.ui
-                           )
+        self.prompt = LatestText(msg,
+                                 position=center + Vec2(-0.36, -0.43),
+                                 scale=1,
+                                 parent=camera.ui
+                                 )
 
     def update_prompt(self, agent_pos, direction_name, agent_action, error_message=None) -> None:
+        # only the last update before a frame is laid out, see LatestText
         msg = f'''           \t {agent_action}
         \t Position @ {(agent_pos[:2])+(abs(agent_pos[-1]),)} ==> {direction_name}
         '''
-        self.prompt.color = color.white
         if error_message:
             msg = error_message + '\n' + '\t' + msg.split('\n')[1]
-            self.prompt.color = color.red
-        self.prompt.text = msg
+            self.prompt.show(msg, color.red)
+        else:
+            self.prompt.show(msg, color.white)
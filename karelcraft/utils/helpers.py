@@ -40,3 +40,34 @@ class KarelException(Exception):
             f"Karel crashed while on position {self.position}, "
             f"facing {self.direction}\nInvalid action: {self.message}"
         )
+
+
+def cell_counts(cells, counts=1) -> dict:
+    '''
+    Normalizes the arguments of batch functions to {(col, row): count};
+    counts is one count for all cells or one count per cell, and
+    repeated cells add up
+    '''
+    keys = [vec2key(cell) for cell in cells]
+    if isinstance(counts, int):
+        counts = [counts] * len(keys)
+    else:
+        counts = [int(count) for count in counts]
+        if len(counts) != len(keys):
+            raise ValueError(f'Error: {len(keys)} cells but {len(counts)} counts.')
+    result = {}
+    for key, count in zip(keys, counts):
+        result[key] = result.get(key, 0) + count
+    return result
+
+
+def mask_counts(mask) -> dict:
+    '''
+    {(col, row): count} of a mask given as rows of counts, mask[row][col]
+    (e.g. a numpy array or nested lists of bools), or already as a dict
+    '''
+    if isinstance(mask, dict):
+        return cell_counts(mask.keys(), list(mask.values()))
+    return {(col, row): int(count)
+            for row, values in enumerate(mask)
+            for col, count in enumerate(values) if count}
@@ -0,0 +1,95 @@
+"""
+Attributes the Karel functions a student program calls to the lines of
+the program that called them, e.g.
+
+    run_karel_program('11x11', line_profile='run.folded')
+
+prints a table of the busiest lines when a run ends and writes the call
+stacks in the collapsed format of flamegraph.pl / speedscope:
+
+    main:4;build_wall:12;move 1532
+"""
+import linecache
+import sys
+from collections import Counter
+from pathlib import Path
+from time import perf_counter
+
+SAMPLE_INTERVAL = 1  # profile every n-th call; counts are scaled back up
+TABLE_ROWS = 20
+
+
+class LineProfiler:
+    '''
+    Called on the program's worker thread for each Karel function: the
+    student frames on the stack are found by their file name, so the
+    cost is one short frame walk per sampled call
+    '''
+
+    def __init__(self, code_file, sample_interval: int = SAMPLE_INTERVAL) -> None:
+        if sample_interval < 1:
+            raise ValueError(f'Error: sample_interval must be at least 1, got {sample_interval}.')
+        self.filename = str(code_file)
+        self.sample_interval = sample_interval
+        self.calls = 0
+        self.actions = Counter()  # line -> actions
+        self.queries = Counter()  # line -> queries
+        self.seconds = Counter()  # line -> seconds spent in the calls
+        self.functions = {}  # line -> name of the enclosing function
+        self.stacks = Counter()  # collapsed stack -> calls
+
+    def student_stack(self) -> tuple:
+        '''
+        ((function, line), ...) of the student frames, outermost first;
+        None if this call is not sampled
+        '''
+        self.calls += 1
+        if self.calls % self.sample_interval:
+            return None
+        stack = []
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_code.co_filename == self.filename:
+                stack.append((frame.f_code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        stack.reverse()
+        return tuple(stack)
+
+    def call(self, run, fn, *args, action: bool = True):
+        '''
+        Carries out the Karel function fn with run(fn, *args, action=action),
+        i.e. ProgramRunner.call(), and charges it to the student line that
+        called it; the time includes waiting for the speed setting
+        '''
+        stack = self.student_stack()
+        if not stack:
+            return run(fn, *args, action=action)
+        start = perf_counter()
+        try:
+            return run(fn, *args, action=action)
+        finally:
+            self.record(stack, fn.__name__, perf_counter() - start, action)
+
+    def record(self, stack: tuple, name: str, seconds: float, action: bool) -> None:
+        n = self.sample_interval
+        function, line = stack[-1]
+        self.functions[line] = function
+        (self.actions if action else self.queries)[line] += n
+        self.seconds[line] += seconds * n
+        self.stacks[';'.join(f'{f}:{l}' for f, l in stack) + ';' + name] += n
+
+    def table(self, rows: int = TABLE_ROWS) -> str:
+        total = sum(self.actions.values()) or 1
+        lines = [f'{"line":>6} {"actions":>9} {"%":>6} {"queries":>9} {"seconds":>9}  source']
+        busiest = sorted(self.functions, key=lambda l: (-self.actions[l], -self.seconds[l]))
+        for line in busiest[:rows]:
+            source = linecache.getline(self.filename, line).strip()
+            lines.append(f'{line:>6} {self.actions[line]:>9} {100 * self.actions[line] / total:>6.1f} '
+                         f'{self.queries[line]:>9} {self.seconds[line]:>9.3f}  '
+                         f'{self.functions[line]}: {source}')
+        return '\n'.join(lines)
+
+    def write_collapsed(self, path) -> None:
+        with open(Path(path), 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f'{stack} {count}\n')
@@ -0,0 +1,136 @@
+"""
+Health and throughput metrics of a running app in the Prometheus text
+format, e.g. for a grading or training service:
+
+    run_karel_program('11x11', metrics_file='karelcraft.prom')  # textfile collector
+    run_karel_program('11x11', metrics_port=9464)  # http://127.0.0.1:9464/metrics
+
+The app's hot path only bumps plain counters (exporter.counts['actions'] += 1);
+a background thread samples them and the registered gauges every interval,
+turns counts into per-second rates and publishes the text.
+"""
+import os
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from time import perf_counter
+
+SAMPLE_INTERVAL = 1.0  # seconds
+PREFIX = 'karelcraft_'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class MetricsExporter:
+
+    def __init__(self, path=None, port: int = None,
+                 interval: float = SAMPLE_INTERVAL) -> None:
+        self.path = Path(path) if path else None
+        self.interval = interval
+        self.counts = Counter()  # bumped by the app, read by the sampler
+        self.metrics = []  # (name, type, help, label, fn)
+        self.rates = {}  # count name -> (value, time) at the last sample
+        self.text = ''
+        self.stopped = threading.Event()
+        self.server = None
+        if port is not None:
+            self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+            threading.Thread(target=self.server.serve_forever, name='metrics-http',
+                             daemon=True).start()
+        self.thread = threading.Thread(target=self._sample_loop, name='metrics-sampler',
+                                       daemon=True)
+
+    def add(self, name: str, kind: str, help_text: str, fn, label: str = None) -> None:
+        '''
+        Registers a metric read by the sampler: fn() returns a number, or
+        {label value: number} for a metric with a label
+        '''
+        self.metrics.append((PREFIX + name, kind, help_text, label, fn))
+
+    def add_count(self, name: str, help_text: str) -> None:
+        '''
+        A counter the app bumps in counts[name], also published as a rate
+        '''
+        self.add(f'{name}_total', 'counter', help_text, lambda: self.counts[name])
+        self.add(f'{name}_per_second', 'gauge', help_text + ' per second',
+                 lambda: self.rate(name))
+
+    def start(self) -> None:
+        '''
+        Publishes a first sample and starts the sampler; later calls do nothing
+        '''
+        if self.thread.ident is not None:
+            return
+        self.rates = {name: (value, perf_counter()) for name, value in self.counts.items()}
+        self.publish()
+        self.thread.start()
+
+    def rate(self, name: str) -> float:
+        value, now = self.counts[name], perf_counter()
+        last_value, last_time = self.rates.get(name, (0, now))
+        self.rates[name] = (value, now)
+        return (value - last_value) / (now - last_time) if now > last_time else 0.
+
+    def sample(self) -> str:
+        lines = []
+        for name, kind, help_text, label, fn in self.metrics:
+            try:
+                value = fn()
+            except Exception:  # e.g. read while the app swaps worlds
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            if isinstance(value, dict):
+                lines.extend(f'{name}{{{label}="{key}"}} {val:g}' for key, val in sorted(value.items()))
+            else:
+                lines.append(f'{name} {value:g}')
+        self.text = '\n'.join(lines) + '\n'
+        return self.text
+
+    def write(self) -> None:
+        # replace at once, so collectors never read a half-written file
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        tmp.write_text(self.text)
+        os.replace(tmp, self.path)
+
+    def publish(self) -> None:
+        self.sample()
+        if self.path:
+            try:
+                self.write()
+            except OSError as e:
+                print(f'KarelCraft: could not write metrics to {self.path}: {e}')
+
+    def _sample_loop(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.publish()
+
+    def _handler(self):
+        exporter = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                body = exporter.text.encode()
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args) -> None:
+                pass  # no line per scrape on the console
+        return Handler
+
+    def close(self) -> None:
+        '''
+        Stops the sampler and the endpoint; the file keeps the final sample
+        '''
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        if self.thread.ident is not None:
+            self.thread.join()
+            self.publish()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
@@ -0,0 +1,142 @@
+# Whole-world observation tensor for RL consumers
+from multiprocessing import shared_memory
+
+import numpy as np
+from karelcraft.utils.direction import Direction
+from karelcraft.utils.world_loader import COLOR_LIST, TEXTURE_LIST
+
+# channel layout of the (C, rows, cols) observation, numpy convention:
+# (0, 0) is the top-left corner, like the env scripts' Q-tables
+CHANNELS = ['beepers', 'paint', 'block_height', 'block_texture'] + \
+    [f'wall_{d.name.lower()}' for d in Direction] + \
+    [f'karel_{d.name.lower()}' for d in Direction]
+CHANNEL = {name: idx for idx, name in enumerate(CHANNELS)}
+DTYPE = np.float32
+
+
+class ObservationPlanes:
+    '''
+    Fixed-layout observation of a world, updated in place as it changes.
+        beepers       : beeper count
+        paint         : COLOR_LIST index + 1 of the corner color, 0 if none
+        block_height  : number of blocks in the cell
+        block_texture : TEXTURE_LIST index + 1 of the top block, 0 if none
+        wall_*        : 1 where the cell has a wall on that side
+        karel_*       : one-hot of Karel's cell, one channel per direction
+    With shared_name, the buffer lives in multiprocessing.shared_memory and
+    other processes can read it with ObservationPlanes.attach(), zero-copy.
+    An existing array of the right shape (e.g. a slice of a batch) can also
+    be passed in to be written directly.
+    '''
+
+    def __init__(self, columns: int, rows: int, shared_name: str = None, array=None) -> None:
+        self.columns = columns
+        self.rows = rows
+        self.shape = (len(CHANNELS), rows, columns)
+        self.shm = None
+        if array is not None:
+            if array.shape != self.shape or array.dtype != DTYPE:
+                raise ValueError(f'Error: observation buffer must be {DTYPE.__name__} {self.shape}.')
+            self.array = array
+        elif shared_name:
+            nbytes = int(np.prod(self.shape)) * np.dtype(DTYPE).itemsize
+            self.shm = shared_memory.SharedMemory(name=shared_name, create=True, size=nbytes)
+            self.array = np.ndarray(self.shape, dtype=DTYPE, buffer=self.shm.buf)
+            self.array.fill(0)
+        else:
+            self.array = np.zeros(self.shape, dtype=DTYPE)
+        self.karel_index = None
+
+    @classmethod
+    def attach(cls, shared_name: str, columns: int, rows: int) -> 'ObservationPlanes':
+        '''
+        Read-side view of planes created by another process
+        '''
+        planes = cls.__new__(cls)
+        planes.columns, planes.rows = columns, rows
+        planes.shape = (len(CHANNELS), rows, columns)
+        planes.shm = shared_memory.SharedMemory(name=shared_name)
+        planes.array = np.ndarray(planes.shape, dtype=DTYPE, buffer=planes.shm.buf)
+        planes.karel_index = None
+        return planes
+
+    def index(self, key) -> tuple:
+        '''
+        World (col, row) -> numpy (row, col)
+        '''
+        return (self.rows - 1 - int(key[1]), int(key[0]))
+
+    def clear(self) -> None:
+        self.array.fill(0)
+        self.karel_index = None
+
+    def update_cell(self, key, tokens) -> None:
+        '''
+        Re-encodes one cell from its stack tokens, see World.stack_string()
+        '''
+        beepers = height = 0
+        paint = texture = 0
+        for token in tokens:
+            if token[0] == 'b':
+                beepers += 1
+            elif token[0] == 'p':
+                paint = int(token[1:]) + 1
+            elif token[0] == 'v':
+                height += 1
+                texture = int(token[1:]) + 1
+        row, col = self.index(key)
+        self.array[CHANNEL['beepers'], row, col] = beepers
+        self.array[CHANNEL['paint'], row, col] = paint
+        self.array[CHANNEL['block_height'], row, col] = height
+        self.array[CHANNEL['block_texture'], row, col] = texture
+
+    def update_walls(self, walls) -> None:
+        '''
+        A wall blocks both cells it separates, so it is marked on the cell
+        it belongs to and, facing the other way, on its neighbour
+        '''
+        self.array[CHANNEL['wall_east']:CHANNEL['wall_north'] + 1] = 0
+        for wall in walls:
+            dx, dy, _ = wall.direction.value
+            self.mark_wall((wall.col, wall.row), wall.direction)
+            self.mark_wall((wall.col + dx, wall.row + dy), Direction.opposite(wall.direction))
+
+    def mark_wall(self, key, direction: Direction) -> None:
+        row, col = self.index(key)
+        if 0 <= row < self.rows and 0 <= col < self.columns:
+            self.array[CHANNEL['wall_' + direction.name.lower()], row, col] = 1
+
+    def update_karel(self, key, direction: Direction) -> None:
+        if self.karel_index:
+            self.array[(slice(CHANNEL['karel_east'], None),) + self.karel_index] = 0
+        self.karel_index = self.index(key)
+        self.array[(CHANNEL['karel_' + direction.name.lower()],) + self.karel_index] = 1
+
+    def load(self, world_loader) -> None:
+        '''
+        Encodes a world file's initial state
+        '''
+        self.clear()
+        stacks = {}
+        for key, count in world_loader.beepers.items():
+            stacks.setdefault(key, []).extend(['b'] * count)
+        for key, color_name in world_loader.corner_colors.items():
+            if color_name:
+                stacks.setdefault(key, []).append(f'p{COLOR_LIST.index(color_name)}')
+        for key, (texture_name, count) in world_loader.blocks.items():
+            if count:
+                stacks.setdefault(key, []).extend([f'v{TEXTURE_LIST.index(texture_name)}'] * count)
+        for key, stack_string in world_loader.stack_strings.items():
+            stacks.setdefault(key, []).extend(stack_string.split())
+        for key, tokens in stacks.items():
+            self.update_cell(key, tokens)
+        self.update_walls(world_loader.walls)
+        self.update_karel(world_loader.start_location, world_loader.start_direction)
+
+    def close(self, unlink: bool = False) -> None:
+        if self.shm is not None:
+            self.array = None
+            self.shm.close()
+            if unlink:
+                self.shm.unlink()
+            self.shm = None
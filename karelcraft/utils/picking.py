@@ -0,0 +1,62 @@
+# Mouse picking on the world grid without colliders
+from math import floor, inf
+
+
+def _slab(origin: float, direction: float, low: float, high: float) -> tuple:
+    '''
+    Ray parameters (t_in, t_out) between the planes low and high of one axis
+    '''
+    if direction == 0:
+        return (-inf, inf) if low <= origin <= high else (inf, -inf)
+    t_low, t_high = (low - origin) / direction, (high - origin) / direction
+    return min(t_low, t_high), max(t_low, t_high)
+
+
+def pick_cell(origin, direction, size, surface) -> tuple:
+    '''
+    First cell (col, row) whose column of items the ray
+    origin + t * direction (t >= 0) runs into, or None.
+
+    Cells are unit squares centered on (col, row) for col < size[0] and
+    row < size[1]. Up is -z: surface(key) is the z of the top face of a
+    cell's stack and the column below it is solid down to the ground plane
+    z = 0. The ray is walked cell by cell (DDA), so the cost grows with the
+    number of cells it crosses, not with the number of items in the world.
+    '''
+    ox, oy, oz = origin[0], origin[1], origin[2]
+    dx, dy, dz = direction[0], direction[1], direction[2]
+    cols, rows = size[0], size[1]
+
+    tx_in, tx_out = _slab(ox, dx, -0.5, cols - 0.5)
+    ty_in, ty_out = _slab(oy, dy, -0.5, rows - 0.5)
+    t_enter = max(tx_in, ty_in, 0)
+    t_end = min(tx_out, ty_out)
+    if dz > 0:  # nothing to hit below the ground
+        t_end = min(t_end, -oz / dz)
+    if t_enter > t_end:
+        return None
+
+    col = min(max(floor(ox + dx * t_enter + 0.5), 0), cols - 1)
+    row = min(max(floor(oy + dy * t_enter + 0.5), 0), rows - 1)
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    t_next_x = (col + 0.5 * step_x - ox) / dx if dx else inf
+    t_next_y = (row + 0.5 * step_y - oy) / dy if dy else inf
+    t_delta_x = abs(1 / dx) if dx else inf
+    t_delta_y = abs(1 / dy) if dy else inf
+
+    while True:
+        t_exit = min(t_next_x, t_next_y, t_end)
+        z_in, z_out = oz + dz * t_enter, oz + dz * t_exit
+        if max(z_in, z_out) >= surface((col, row)) and min(z_in, z_out) <= 0:
+            return (col, row)
+        if t_exit >= t_end:
+            return None
+        if t_next_x < t_next_y:
+            col += step_x
+            t_enter, t_next_x = t_next_x, t_next_x + t_delta_x
+        else:
+            row += step_y
+            t_enter, t_next_y = t_next_y, t_next_y + t_delta_y
+        if not (0 <= col < cols and 0 <= row < rows):
+            return None
@@ -0,0 +1,88 @@
+# Built-in counters for where the time of a run goes
+import math
+from collections import defaultdict
+
+BUCKETS_PER_OCTAVE = 8  # histogram resolution, about 9% per bucket
+MIN_SECONDS = 1e-7
+PHASES = ('sim', 'render', 'wait')
+
+
+class Histogram:
+    '''
+    Log-bucketed latency histogram: constant memory however many values
+    are added, quantiles accurate to about one bucket width
+    '''
+
+    def __init__(self) -> None:
+        self.buckets = defaultdict(int)
+        self.count = 0
+        self.total = 0.
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.buckets[int(math.log2(max(seconds, MIN_SECONDS) / MIN_SECONDS) * BUCKETS_PER_OCTAVE)] += 1
+
+    def quantile(self, q: float) -> float:
+        '''
+        Upper bound of the bucket holding the q-th value, in seconds
+        '''
+        rank = q * self.count
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return MIN_SECONDS * 2 ** ((bucket + 1) / BUCKETS_PER_OCTAVE)
+        return 0.
+
+
+class Profiler:
+    '''
+    Per-primitive call counts and latencies, per-frame sim/render/wait
+    phase times, and entity create/destroy counts.
+    sim is the main thread carrying out Karel functions, render is the
+    ursina frame (update() of all entities and drawing), wait is the main
+    thread blocked on the student program, i.e. the student's own logic.
+    The app only calls into it when profiling is on, see App(profile=True).
+    '''
+
+    def __init__(self) -> None:
+        self.primitives = defaultdict(Histogram)
+        self.phases = {phase: Histogram() for phase in PHASES}
+        self.frames = 0
+        self.created = 0
+        self.alive_start = None
+        self.alive = 0
+
+    def primitive(self, name: str, seconds: float) -> None:
+        self.primitives[name].add(seconds)
+
+    def frame(self, alive: int, **phase_seconds) -> None:
+        '''
+        Ends a frame: alive is the number of live entities, phase_seconds
+        the time spent in each phase during it
+        '''
+        self.frames += 1
+        if self.alive_start is None:
+            self.alive_start = alive
+        self.alive = alive
+        for phase, seconds in phase_seconds.items():
+            self.phases[phase].add(seconds)
+
+    @property
+    def destroyed(self) -> int:
+        return self.created - (self.alive - (self.alive_start or 0))
+
+    def report(self) -> str:
+        ms = 1000
+        lines = [f'{"primitive":<20} {"calls":>9} {"total ms":>10} {"p50 us":>9} {"p99 us":>9}']
+        for name, hist in sorted(self.primitives.items(), key=lambda item: -item[1].total):
+            lines.append(f'{name:<20} {hist.count:>9} {hist.total * ms:>10.1f} '
+                         f'{hist.quantile(0.5) * 1e6:>9.1f} {hist.quantile(0.99) * 1e6:>9.1f}')
+        lines.append(f'{"phase per frame":<20} {"frames":>9} {"total ms":>10} {"p50 ms":>9} {"p99 ms":>9}')
+        for phase, hist in self.phases.items():
+            lines.append(f'{phase:<20} {hist.count:>9} {hist.total * ms:>10.1f} '
+                         f'{hist.quantile(0.5) * ms:>9.2f} {hist.quantile(0.99) * ms:>9.2f}')
+        lines.append(f'frames: {self.frames}, entities created: {self.created}, '
+                     f'destroyed: {self.destroyed}, alive: {self.alive}')
+        return '\n'.join(lines)
@@ -0,0 +1,115 @@
+# Runs a student program on a worker thread, its Karel commands on the main thread
+import queue
+import threading
+from typing import Callable
+
+QUEUE_SIZE = 64
+POLL = 0.05  # seconds between checks for a stop while the worker waits
+
+
+class StopProgram(BaseException):
+    '''
+    Raised inside the student program once it is stopped; a BaseException so
+    that a student's `except Exception` does not swallow it
+    '''
+
+
+class Command:
+    __slots__ = ('fn', 'args', 'action', 'result', 'error', 'done')
+
+    def __init__(self, fn: Callable, args: tuple, action: bool) -> None:
+        self.fn = fn
+        self.args = args
+        self.action = action  # paced by the speed setting, unlike queries
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class ProgramRunner:
+    '''
+    Runs main() on a daemon thread. The Karel functions it calls go through
+    call(), which queues them and waits until the main thread has executed
+    them with next_command()/execute() between frames, so the world is only
+    ever touched by the render thread and the UI stays responsive while
+    the program runs or sleeps.
+    '''
+
+    def __init__(self, main: Callable, maxsize: int = QUEUE_SIZE) -> None:
+        self.main = main
+        self.commands = queue.Queue(maxsize)
+        self.stopped = threading.Event()
+        self.exception = None  # what main() ended with, if not a stop
+        self.thread = threading.Thread(target=self._run, name='karel-program', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def _run(self) -> None:
+        try:
+            self.main()
+        except StopProgram:
+            pass
+        except BaseException as e:
+            self.exception = e
+
+    @property
+    def finished(self) -> bool:
+        return not self.thread.is_alive() and self.commands.empty()
+
+    def on_worker(self) -> bool:
+        return threading.current_thread() is self.thread
+
+    def call(self, fn: Callable, *args, action: bool = True):
+        '''
+        Worker side: has the main thread execute fn(*args) and returns its
+        result; exceptions raised by fn, e.g. a KarelException, are re-raised
+        here, in the student program
+        '''
+        command = Command(fn, args, action)
+        while True:
+            if self.stopped.is_set():
+                raise StopProgram
+            try:
+                self.commands.put(command, timeout=POLL)
+                break
+            except queue.Full:
+                pass
+        while not command.done.wait(POLL):
+            if self.stopped.is_set():
+                raise StopProgram
+        if command.error is not None:
+            raise command.error
+        return command.result
+
+    def next_command(self, timeout: float = 0) -> Command:
+        '''
+        Main side: the next queued command, waiting at most timeout seconds;
+        None if there is none
+        '''
+        try:
+            if timeout > 0:
+                return self.commands.get(timeout=timeout)
+            return self.commands.get_nowait()
+        except queue.Empty:
+            return None
+
+    def execute(self, command: Command) -> bool:
+        '''
+        Main side: runs a command and hands its outcome to the waiting worker.
+        Returns whether it was an action
+        '''
+        try:
+            command.result = command.fn(*command.args)
+        except Exception as e:
+            command.error = e
+        finally:
+            command.done.set()
+        return command.action
+
+    def stop(self) -> None:
+        '''
+        The program raises StopProgram at its next Karel command; commands
+        still queued are never executed
+        '''
+        self.stopped.set()
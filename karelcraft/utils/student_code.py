@@ -4,8 +4,56 @@ import importlib.util
 import traceback as tb
 import inspect
 import sys
+from typing import TYPE_CHECKING
 
-from karelcraft.entities.karel import Karel
+if TYPE_CHECKING:  # keeps ursina out of the import chain
+    from karelcraft.entities.karel import Karel
+
+# Karel functions a student program calls, see karelcraft/karelcraft.py
+KAREL_FUNCTIONS = [
+    "move",
+    "turn_left",
+    "turn_right",
+    "pick_beeper",
+    "put_beeper",
+    "put_block",
+    "destroy_block",
+    "facing_north",
+    "facing_south",
+    "facing_east",
+    "facing_west",
+    "not_facing_north",
+    "not_facing_south",
+    "not_facing_east",
+    "not_facing_west",
+    "front_is_clear",
+    "beeper_present",
+    "beepers_present",
+    "no_beeper_present",
+    "no_beepers_present",
+    "block_present",
+    "no_block_present",
+    "beepers_in_bag",
+    "no_beepers_in_bag",
+    "front_is_blocked",
+    "left_is_blocked",
+    "left_is_clear",
+    "right_is_blocked",
+    "right_is_clear",
+    "paint_corner",
+    "remove_paint",
+    "paint_region",
+    "put_beepers",
+    "place_blocks",
+    "corner_color_is",
+    "color_present",
+    "no_color_present",
+    "get_position",
+    "reset",
+    "world_size",
+    "get_observation",
+    "prompt",
+]
 
 
 class StudentCode:
@@ -39,50 +87,10 @@ class StudentCode:
     def __repr__(self) -> str:
         return inspect.getsource(self.mod)
 
-    def inject_namespace(self, karel: Karel) -> None:
+    def inject_namespace(self, karel: 'Karel') -> None:
         """
         This function associates the generic commands the student code to
         specific commands in KarelCraft. (Credits: stanford.karel module)
         """
-        functions_to_override = [
-            "move",
-            "turn_left",
-            "turn_right",
-            "pick_beeper",
-            "put_beeper",
-            "put_block",
-            "destroy_block",
-            "facing_north",
-            "facing_south",
-            "facing_east",
-            "facing_west",
-            "not_facing_north",
-            "not_facing_south",
-            "not_facing_east",
-            "not_facing_west",
-            "front_is_clear",
-            "beeper_present",
-            "beepers_present",
-            "no_beeper_present",
-            "no_beepers_present",
-            "block_present",
-            "no_block_present",
-            "beepers_in_bag",
-            "no_beepers_in_bag",
-            "front_is_blocked",
-            "left_is_blocked",
-            "left_is_clear",
-            "right_is_blocked",
-            "right_is_clear",
-            "paint_corner",
-            "remove_paint",
-            "corner_color_is",
-            "color_present",
-            "no_color_present",
-            "get_position",
-            "reset",
-            "world_size",
-            "prompt",
-        ]
-        for func in functions_to_override:
+        for func in KAREL_FUNCTIONS:
             setattr(self.mod, func, getattr(karel, func))
@@ -0,0 +1,77 @@
+# Block textures packed into one lazily built texture
+from math import ceil, sqrt
+from pathlib import Path
+import zlib
+
+from ursina import Texture, Vec2
+
+BLOCKS_PATH = Path(__file__).absolute().parent.parent.parent / 'assets' / 'blocks'
+CACHE_DIR = '.cache'
+
+
+class TextureAtlas:
+    '''
+    All <name>_block.png images of blocks_path tiled into a single texture.
+    The atlas is only built (and cached under blocks_path/.cache/) the first
+    time a block is drawn; voxels then share it and select their tile with
+    texture_offset/texture_scale instead of binding one texture each.
+    '''
+
+    def __init__(self, blocks_path: Path = BLOCKS_PATH) -> None:
+        self.blocks_path = Path(blocks_path)
+        # glob order, as before the atlas: the 1-9 hotkeys pick names[key - 1]
+        self.paths = list(self.blocks_path.glob('*_block.png'))
+        if not self.paths:
+            raise FileNotFoundError(f'No block textures found in {self.blocks_path}')
+        self.names = [path.stem.split('_')[0] for path in self.paths]
+        self.index = {name: idx for idx, name in enumerate(self.names)}
+        self.columns = ceil(sqrt(len(self.paths)))
+        self.rows = ceil(len(self.paths) / self.columns)
+        self.tile_scale = Vec2(1 / self.columns, 1 / self.rows)
+        self._texture = None
+
+    def __contains__(self, texture_name: str) -> bool:
+        return texture_name in self.index
+
+    def tile_offset(self, texture_name: str) -> Vec2:
+        '''
+        UV offset of a block's tile; UV (0, 0) is the bottom-left of the atlas
+        '''
+        if texture_name not in self.index:
+            raise ValueError(f'Error: {texture_name} is not a valid block texture.')
+        row, col = divmod(self.index[texture_name], self.columns)
+        return Vec2(col / self.columns, (self.rows - 1 - row) / self.rows)
+
+    @property
+    def texture(self) -> Texture:
+        if self._texture is None:
+            self._texture = Texture(self._load())
+            self._texture.filtering = None  # no bleeding between tiles
+        return self._texture
+
+    def cache_file(self) -> Path:
+        # keyed by the source files, so adding or editing a block rebuilds it
+        key = ''.join(f'{path.name}{path.stat().st_mtime_ns}' for path in self.paths)
+        return self.blocks_path / CACHE_DIR / f'atlas_{zlib.crc32(key.encode()):08x}.png'
+
+    def _load(self):
+        '''
+        Path of the cached atlas, built first if needed
+        '''
+        cache_file = self.cache_file()
+        if cache_file.is_file():
+            return cache_file
+        from PIL import Image  # comes with ursina; only needed to build
+        tiles = [Image.open(path).convert('RGBA') for path in self.paths]
+        width = max(tile.width for tile in tiles)
+        height = max(tile.height for tile in tiles)
+        atlas = Image.new('RGBA', (width * self.columns, height * self.rows))
+        for idx, tile in enumerate(tiles):
+            row, col = divmod(idx, self.columns)
+            atlas.paste(tile.resize((width, height)), (col * width, row * height))
+        try:
+            cache_file.parent.mkdir(exist_ok=True)
+            atlas.save(cache_file)
+        except OSError:
+            return atlas  # read-only install: keep the atlas in memory only
+        return cache_file
@@ -0,0 +1,108 @@
+"""
+Replays an action trace (see karelcraft.utils.action_trace) on a headless
+WorldModel, e.g. to inspect step 900000 of a long run:
+
+    replayer = TraceReplayer('run.trace')
+    replayer.seek(900000)
+    replayer.model.position, replayer.model.stacks
+
+The state after every `keyframe_interval` steps is kept as a snapshot, so
+once the trace has been played up to a step, seeking anywhere before it
+replays at most keyframe_interval records.
+"""
+from itertools import islice
+
+from karelcraft.utils.action_trace import TraceReader, state_hash
+from karelcraft.utils.helpers import KarelException
+from karelcraft.utils.world_model import WorldModel
+
+KEYFRAME_INTERVAL = 4096
+# the functions that change the world; queries are skipped on replay
+ACTIONS = ('move', 'turn_left', 'turn_right', 'put_beeper', 'pick_beeper',
+           'paint_corner', 'remove_paint', 'put_block', 'destroy_block')
+ARG_ACTIONS = ('paint_corner', 'put_block')
+BATCH_ACTIONS = ('paint_region', 'put_beepers', 'place_blocks')
+
+
+class TraceReplayer:
+
+    def __init__(self, trace_file, world_file: str = None,
+                 keyframe_interval: int = KEYFRAME_INTERVAL) -> None:
+        self.reader = TraceReader(trace_file)
+        self.model = WorldModel(self.reader.world_file if world_file is None else world_file)
+        self.keyframe_interval = keyframe_interval
+        self.keyframes = [self.model.snapshot()]  # state at step i * keyframe_interval
+        self.step = 0  # records applied so far
+        self.record = None  # the last record applied
+        self.diverged_at = None  # first step whose state hash does not match
+
+    def __len__(self) -> int:
+        return len(self.reader)
+
+    def apply(self, record) -> None:
+        if record.failed:
+            pass  # the call raised, e.g. a KarelException: the world is unchanged
+        elif self.unknown_arg(record):
+            # e.g. put_block('marble') with a marble_block.png added to the
+            # assets: the app could place it, but the trace cannot name it
+            # and the model cannot follow from here on
+            if self.diverged_at is None:
+                self.diverged_at = record.step
+        elif record.name in ACTIONS:
+            try:
+                if record.name in ARG_ACTIONS:
+                    getattr(self.model, record.name)(record.arg)
+                else:
+                    getattr(self.model, record.name)()
+            except KarelException:
+                pass  # failed on replay as well, the world is unchanged
+        elif record.name in BATCH_ACTIONS:
+            getattr(self.model, record.name)(*record.arg)
+        elif record.name == 'reset':
+            self.model.reset(record.arg)
+        if record.state_hash is not None and self.diverged_at is None:
+            position = self.model.position
+            if record.state_hash != state_hash(position, self.model.direction.name,
+                                               self.model.num_beepers,
+                                               ' '.join(self.model.stacks.get(position, []))):
+                self.diverged_at = record.step
+        self.record = record
+        self.step = record.step + 1
+        if self.step % self.keyframe_interval == 0 and \
+                self.step // self.keyframe_interval == len(self.keyframes):
+            self.keyframes.append(self.model.snapshot())
+
+    @staticmethod
+    def unknown_arg(record) -> bool:
+        '''
+        Whether the record's color or texture was stored as UNKNOWN
+        '''
+        if record.name in ARG_ACTIONS:
+            return record.arg is None
+        if record.name in BATCH_ACTIONS and record.name != 'put_beepers':
+            return record.arg[1] is None
+        return False
+
+    def seek(self, step: int) -> int:
+        '''
+        Brings the model to the state after `step` records, starting from
+        the closest keyframe or the current state, whichever is nearer
+        '''
+        step = max(0, min(step, len(self)))
+        keyframe = min(step // self.keyframe_interval, len(self.keyframes) - 1)
+        start = keyframe * self.keyframe_interval
+        if not start <= self.step <= step:
+            self.model.restore(self.keyframes[keyframe])
+            self.step, self.record = start, None
+        for record in islice(self.reader.records(self.step), step - self.step):
+            self.apply(record)
+        return self.step
+
+    def forward(self, steps: int = 1) -> int:
+        return self.seek(self.step + steps)
+
+    def backward(self, steps: int = 1) -> int:
+        return self.seek(self.step - steps)
+
+    def close(self) -> None:
+        self.reader.close()
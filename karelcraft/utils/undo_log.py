@@ -0,0 +1,101 @@
+# Step back and forward through the actions of a run
+from collections import deque
+from typing import NamedTuple
+
+MAX_STEPS = 100_000  # changes kept; older steps can no longer be revisited
+SNAPSHOT_INTERVAL = 1000
+
+
+class Pose(NamedTuple):
+    key: tuple
+    direction: object  # Direction
+    num_beepers: int
+
+
+class Change(NamedTuple):
+    '''
+    What one action did: cells maps key -> (stack_string before, after);
+    stack strings and poses are absolute, so a change can be undone and
+    redone in either direction without replaying anything else
+    '''
+    name: str
+    cells: dict
+    before: Pose
+    after: Pose
+
+
+class UndoLog:
+    '''
+    The changes of the last max_steps actions, plus a snapshot of the whole
+    world every snapshot_interval steps so that seek() never applies more
+    than about snapshot_interval / 2 changes.
+    Step numbers count actions; step s is the state after s actions.
+    '''
+
+    def __init__(self, max_steps: int = MAX_STEPS,
+                 snapshot_interval: int = SNAPSHOT_INTERVAL) -> None:
+        self.max_steps = max_steps
+        self.snapshot_interval = snapshot_interval
+        self.clear()
+
+    def clear(self) -> None:
+        self.changes = deque()  # changes[i] leads from step first + i to first + i + 1
+        self.snapshots = {}  # step -> (stacks, pose)
+        self.first = 0
+        self.step = 0
+
+    @property
+    def last(self) -> int:
+        return self.first + len(self.changes)
+
+    def record(self, change: Change, snapshot=None) -> None:
+        '''
+        Appends the change of a new action, dropping the steps that were
+        undone; snapshot() returns the state after it as (stacks, pose)
+        '''
+        if self.last > self.step:
+            while self.last > self.step:
+                self.changes.pop()
+            self.snapshots = {step: s for step, s in self.snapshots.items() if step <= self.step}
+        self.changes.append(change)
+        self.step += 1
+        if snapshot is not None and self.step % self.snapshot_interval == 0:
+            self.snapshots[self.step] = snapshot()
+        while len(self.changes) > self.max_steps:
+            self.changes.popleft()
+            self.snapshots.pop(self.first, None)
+            self.first += 1
+
+    def back(self) -> Change:
+        '''
+        Moves one step back; apply the returned change's before state
+        '''
+        if self.step <= self.first:
+            return None
+        self.step -= 1
+        return self.changes[self.step - self.first]
+
+    def forward(self) -> Change:
+        '''
+        Moves one step forward; apply the returned change's after state
+        '''
+        if self.step >= self.last:
+            return None
+        self.step += 1
+        return self.changes[self.step - 1 - self.first]
+
+    def seek(self, step: int) -> tuple:
+        '''
+        Moves to step, returns (snapshot or None, changes, backward): restore
+        the snapshot if any, then apply the changes' before states if
+        backward, else their after states, in order
+        '''
+        step = max(self.first, min(step, self.last))
+        start, snapshot = self.step, None
+        nearest = min(self.snapshots, key=lambda s: abs(s - step), default=None)
+        if nearest is not None and abs(nearest - step) < abs(self.step - step):
+            start, snapshot = nearest, self.snapshots[nearest]
+        self.step = step
+        if step < start:
+            return snapshot, [self.changes[s - self.first] for s in range(start - 1, step - 1, -1)], True
+        return snapshot, [self.changes[s - self.first] for s in range(start, step)], False
@@ -0,0 +1,278 @@
+# Headless Karel world: same rules as entities.World/Karel without ursina
+from collections import defaultdict
+
+from karelcraft.utils.direction import Direction
+from karelcraft.utils.helpers import INFINITY, KarelException, cell_counts, mask_counts
+from karelcraft.utils.world_loader import WorldLoader, COLOR_LIST, TEXTURE_LIST
+
+
+class WorldModel:
+    '''
+    Pure-Python Karel world for servers, replays and RL rollouts.
+    Each cell holds a stack of tokens as in World.stack_string():
+        beeper : 'b'
+        voxel  : 'v' + idx of texture
+        paint  : 'p' + idx of color
+    '''
+
+    def __init__(self, world_file: str = '') -> None:
+        self.world_loader = WorldLoader(world_file)
+        self.columns = self.world_loader.columns
+        self.rows = self.world_loader.rows
+        self.observation = None
+        self.reset()
+
+    def reset(self, new_position=None) -> tuple:
+        self.stacks: dict[tuple[int, int], list] = defaultdict(list)
+        self.walls = set(self.world_loader.walls)
+        # same load order as World.reset()
+        for key, val in self.world_loader.beepers.items():
+            self.stacks[key].extend(['b'] * val)
+        for key, color_name in self.world_loader.corner_colors.items():
+            if color_name:
+                self._paint(key, color_name)
+        for key, (texture_name, count) in self.world_loader.blocks.items():
+            self.stacks[key].extend([f'v{TEXTURE_LIST.index(texture_name)}'] * count)
+        for key, stack_string in self.world_loader.stack_strings.items():
+            self.stacks[key].extend(stack_string.split())
+        self.position = tuple(new_position or self.world_loader.start_location)
+        self.position = (int(self.position[0]), int(self.position[1]))
+        self.direction = self.world_loader.start_direction
+        self.start_beeper_count = self.world_loader.start_beeper_count
+        self.num_beepers = self.start_beeper_count
+        if self.observation is not None:
+            self.sync_observation()
+        return self.position
+
+    # Observation
+
+    def enable_observation(self, shared_name: str = None, array=None):
+        if self.observation is None:
+            from karelcraft.utils.observation import ObservationPlanes
+            self.observation = ObservationPlanes(self.columns, self.rows, shared_name, array)
+            self.sync_observation()
+        return self.observation
+
+    def sync_observation(self) -> None:
+        self.observation.clear()
+        for key, tokens in self.stacks.items():
+            self.observation.update_cell(key, tokens)
+        self.observation.update_walls(self.walls)
+        self.observation.update_karel(self.position, self.direction)
+
+    def _observe(self, key) -> None:
+        if self.observation is not None:
+            self.observation.update_cell(key, self.stacks.get(key, []))
+
+    def _observe_pose(self) -> None:
+        if self.observation is not None:
+            self.observation.update_karel(self.position, self.direction)
+
+    # Snapshots
+
+    def snapshot(self) -> tuple:
+        stacks = {key: tuple(tokens) for key, tokens in self.stacks.items() if tokens}
+        return (stacks, frozenset(self.walls), self.position, self.direction, self.num_beepers)
+
+    def restore(self, snapshot: tuple) -> None:
+        stacks, walls, self.position, self.direction, self.num_beepers = snapshot
+        self.stacks = defaultdict(list, {key: list(tokens) for key, tokens in stacks.items()})
+        self.walls = set(walls)
+        if self.observation is not None:
+            self.sync_observation()
+
+    # Stack queries
+
+    def top_in_stack(self, key):
+        item_stack = self.stacks.get(key, [])
+        return item_stack[-1] if item_stack else None
+
+    def count_beepers(self, key) -> int:
+        return sum(token == 'b' for token in self.stacks.get(key, []))
+
+    def count_blocks(self, key) -> int:
+        return sum(token[0] == 'v' for token in self.stacks.get(key, []))
+
+    def corner_color(self, key) -> str:
+        top = self.top_in_stack(key)
+        if top and top[0] == 'p':
+            return COLOR_LIST[int(top[1:])]
+        return None
+
+    def top_texture(self, key) -> str:
+        top = self.top_in_stack(key)
+        if top and top[0] == 'v':
+            return TEXTURE_LIST[int(top[1:])]
+        return None
+
+    def is_inside(self, position) -> bool:
+        return 0 <= position[0] < self.columns and 0 <= position[1] < self.rows
+
+    def wall_exists(self, position, direction) -> bool:
+        return (position[0], position[1], direction) in self.walls
+
+    # Karel commands
+
+    def _raise(self, action: str, message: str):
+        raise KarelException(self.position, self.direction.name, action, message)
+
+    def direction_is_clear(self, direction) -> bool:
+        new_position = (self.position[0] + direction.value[0],
+                        self.position[1] + direction.value[1])
+        is_wall = self.wall_exists(self.position, direction) or \
+            self.wall_exists(new_position, Direction.opposite(direction))
+        return self.is_inside(new_position) and not is_wall
+
+    def front_is_clear(self) -> bool:
+        return self.direction_is_clear(self.direction)
+
+    def front_is_blocked(self) -> bool:
+        return not self.front_is_clear()
+
+    def left_is_clear(self) -> bool:
+        return self.direction_is_clear(Direction.rotate90(self.direction))
+
+    def left_is_blocked(self) -> bool:
+        return not self.left_is_clear()
+
+    def right_is_clear(self) -> bool:
+        return self.direction_is_clear(Direction.rotate90(self.direction, 'counterclockwise'))
+
+    def right_is_blocked(self) -> bool:
+        return not self.right_is_clear()
+
+    def facing_east(self) -> bool:
+        return self.direction == Direction.EAST
+
+    def facing_north(self) -> bool:
+        return self.direction == Direction.NORTH
+
+    def facing_west(self) -> bool:
+        return self.direction == Direction.WEST
+
+    def facing_south(self) -> bool:
+        return self.direction == Direction.SOUTH
+
+    def move(self) -> None:
+        if self.front_is_blocked():
+            self._raise('move()', 'ERROR attempt to move()')
+        self.position = (self.position[0] + self.direction.value[0],
+                         self.position[1] + self.direction.value[1])
+        self._observe_pose()
+
+    def turn_left(self) -> None:
+        self.direction = Direction.rotate90(self.direction)
+        self._observe_pose()
+
+    def turn_right(self) -> None:
+        self.direction = Direction.rotate90(self.direction, 'counterclockwise')
+        self._observe_pose()
+
+    def face(self, direction: Direction) -> None:
+        self.direction = direction
+        self._observe_pose()
+
+    def put_beeper(self) -> int:
+        if self.num_beepers == 0:
+            self._raise('put_beeper()', 'ERROR attempt to put_beeper(), (none left in bag)')
+        if self.num_beepers != INFINITY:
+            self.num_beepers -= 1
+        self.stacks[self.position].append('b')
+        self._observe(self.position)
+        return self.count_beepers(self.position)
+
+    def pick_beeper(self) -> int:
+        if not self.count_beepers(self.position):
+            self._raise('pick_beeper()', 'ERROR attempt to pick_beeper()')
+        if self.num_beepers != INFINITY:
+            self.num_beepers += 1
+        if self.top_in_stack(self.position) == 'b':
+            self.stacks[self.position].pop()
+            self._observe(self.position)
+        return self.count_beepers(self.position)
+
+    def beeper_present(self) -> bool:
+        return bool(self.count_beepers(self.position))
+
+    def beepers_in_bag(self) -> bool:
+        return self.num_beepers != 0
+
+    def _paint(self, key, color_name: str) -> None:
+        top = self.top_in_stack(key)
+        if top and top[0] == 'p':  # no stacking of paints
+            self.stacks[key].pop()
+        self.stacks[key].append(f'p{COLOR_LIST.index(color_name)}')
+
+    def paint_corner(self, color_name: str) -> None:
+        self._paint(self.position, color_name)
+        self._observe(self.position)
+
+    def remove_paint(self) -> None:
+        if not self.color_present():
+            self._raise('remove_paint()', 'ERROR attempt to remove_paint()')
+        self.stacks[self.position].pop()
+        self._observe(self.position)
+
+    def corner_color_is(self, color_name: str) -> bool:
+        return self.corner_color(self.position) == color_name
+
+    def color_present(self) -> bool:
+        return bool(self.corner_color(self.position))
+
+    def put_block(self, texture_name: str) -> None:
+        self.stacks[self.position].append(f'v{TEXTURE_LIST.index(texture_name)}')
+        self._observe(self.position)
+
+    def block_present(self) -> bool:
+        return bool(self.count_blocks(self.position))
+
+    def destroy_block(self) -> None:
+        if not self.block_present():
+            self._raise('destroy_block()', 'ERROR attempted to destroy_block()')
+        if self.top_texture(self.position):
+            self.stacks[self.position].pop()
+            self._observe(self.position)
+
+    # Batch commands, see World.paint_region() etc.
+
+    def _check_cells(self, keys) -> None:
+        for key in keys:
+            if not self.is_inside(key):
+                raise ValueError(f'Error: {key} is outside the world.')
+
+    def paint_region(self, cells, color_name: str) -> int:
+        if color_name not in COLOR_LIST:
+            raise ValueError(f'Error: {color_name} is not a valid color.')
+        keys = list(cell_counts(cells))
+        self._check_cells(keys)
+        for key in keys:
+            self._paint(key, color_name)
+            self._observe(key)
+        return len(keys)
+
+    def put_beepers(self, cells, counts=1) -> int:
+        beepers = cell_counts(cells, counts)
+        self._check_cells(beepers)
+        if any(count < 0 for count in beepers.values()):
+            raise ValueError('Error: beeper counts must not be negative.')
+        for key, count in beepers.items():
+            self.stacks[key].extend(['b'] * count)
+            self._observe(key)
+        return sum(beepers.values())
+
+    def place_blocks(self, mask, texture_name: str) -> int:
+        if texture_name not in TEXTURE_LIST:
+            raise ValueError(f'Error: {texture_name} is not a valid block texture.')
+        blocks = mask_counts(mask)
+        self._check_cells(blocks)
+        token = f'v{TEXTURE_LIST.index(texture_name)}'
+        for key, count in blocks.items():
+            self.stacks[key].extend([token] * count)
+            self._observe(key)
+        return sum(blocks.values())
+
+    def get_position(self) -> tuple:
+        return self.position
+
+    def world_size(self) -> tuple:
+        return (self.columns, self.rows)
@@ -10,8 +10,11 @@ from karelcraft.karelcraft import *
 import os
 from pathlib import Path
 import numpy as np
+from karelcraft.rl.metrics import TrainingMetrics
+from karelcraft.rl.planning import PrioritizedSweeping
 
 # MODE = 'learn'
+# MODE = 'plan'  # learn with prioritized sweeping, far fewer env steps
 MODE = 'play'
 
 # Karel Actions
@@ -86,6 +89,7 @@ class WarehouseEnv:
     def set_model_path(self):
         self.model_dir = os.path.join('training', 'model')
         Path(self.model_dir).mkdir(parents=True, exist_ok=True)
+        self.metrics_path = os.path.join('training', 'logs', 'warehouse_metrics.csv')
 
     def step(self, action_idx):
         '''
@@ -184,14 +188,18 @@ class WarehouseEnv:
                 shortest_path.append(self.numpy2world(current_state, self.rows))
         return shortest_path
 
-    def learn(self, num_episodes=1000, epsilon=0.9, discount_factor=0.9, learning_rate=0.9):
+    def learn(self, num_episodes=1000, epsilon=0.9, discount_factor=0.9, learning_rate=0.9,
+              min_delta_q=None, metrics=None):
         '''
         epsilon - percent of time to take the best action (instead of a random)
         discount_factor  - discount factor for future rewards
         learning_rate - the rate at which the AI agent should learn
+        min_delta_q - stop early once max |dQ| per episode stays below this
         '''
+        metrics = metrics or TrainingMetrics(self.metrics_path, min_delta_q=min_delta_q)
         for i in range(num_episodes):
-            prompt(f'Train episode: {i}')
+            if self.render:
+                prompt(f'Train episode: {i}')
             self.agent_position = self.get_start_location()
             observation = self.agent_position
             if self.render:
@@ -213,8 +221,14 @@ class WarehouseEnv:
                 # update the Q-value for the previous state and action pair
                 new_q_value = old_q_value + (learning_rate * temporal_difference)  # Bellman
                 self.q_values[old_state[0], old_state[1], action_idx] = new_q_value
+                metrics.step(reward, new_q_value - old_q_value)
+
+            if metrics.end_episode(i, epsilon):
+                print(f'Converged after {i + 1} episodes')
+                break
 
-        print(self.q_values)
+        metrics.close()
+        print(metrics.summary())
         np.save(self.model_dir + '/warehouse_q_values.npy', self.q_values)
         prompt('Training complete!')
 
@@ -266,6 +280,10 @@ def main():
     env = WarehouseEnv(render=False)
     if MODE == 'learn':
         env.learn()
+    elif MODE == 'plan':
+        PrioritizedSweeping(env).learn()
+        np.save(env.model_dir + '/warehouse_q_values.npy', env.q_values)
+        prompt('Training complete!')
     elif MODE == 'play':
         env.play()  # needs q_values stored in ./training/model/ dir
     else:
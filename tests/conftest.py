@@ -0,0 +1,88 @@
+"""
+Shared fixtures. The App tests run ursina on an offscreen buffer; panda3d
+allows one ShowBase per process, so they share a single App.
+"""
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+REPO_PATH = Path(__file__).absolute().parent.parent
+
+PROGRAM = '''from karelcraft.karelcraft import *
+
+
+def main():
+    for _ in range({moves}):
+        if front_is_clear():
+            move()
+        else:
+            turn_left()
+    put_beeper()
+'''
+
+
+def write_program(folder: Path, name: str, moves: int = 5) -> Path:
+    path = folder / f'{name}.py'
+    path.write_text(PROGRAM.format(moves=moves))
+    return path
+
+
+def _headless_showbase() -> None:
+    '''
+    Offscreen window without a display; an offscreen ShowBase has no
+    button thrower or mouse watcher, which ursina expects
+    '''
+    from panda3d.core import ButtonThrower, MouseWatcher, NodePath, loadPrcFileData
+    loadPrcFileData('', 'window-type offscreen\naudio-library-name null\n'
+                        'load-display p3headlessgl')
+    from direct.showbase import ShowBase
+    base_init = ShowBase.ShowBase.__init__
+
+    def init(self, *args, **kwargs):
+        base_init(self, *args, **kwargs)
+        if not self.buttonThrowers:
+            self.buttonThrowers = [NodePath(ButtonThrower('button_thrower'))]
+            self.mouseWatcherNode = MouseWatcher('mouse_watcher')
+            self.mouseWatcher = NodePath(self.mouseWatcherNode)
+    ShowBase.ShowBase.__init__ = init
+
+
+@pytest.fixture(scope='session')
+def app_paths(tmp_path_factory) -> dict:
+    folder = tmp_path_factory.mktemp('app')
+    return {'folder': folder,
+            'program': write_program(folder, 'first_program'),
+            'metrics_file': folder / 'karelcraft.prom',
+            'socket': str(folder / 'karelcraft.sock')}
+
+
+@pytest.fixture(scope='session')
+def app(app_paths):
+    pytest.importorskip('ursina')
+    _headless_showbase()
+    from panda3d.core import GraphicsPipeSelection
+    if GraphicsPipeSelection.get_global_ptr().make_default_pipe() is None:
+        pytest.skip('no graphics pipe for an offscreen window')
+    os.chdir(REPO_PATH)  # assets are loaded relative to the repo
+    from ursina import application
+    application.asset_folder = REPO_PATH  # not the folder of pytest's __main__
+    from karelcraft.karel_application import App
+    app = App(app_paths['program'], '', socket_path=app_paths['socket'],
+              metrics_file=app_paths['metrics_file'])
+    app.mute = True
+    yield app
+    app.close_metrics()
+    app.server.close()
+
+
+def run_frames(app, seconds: float, until=None) -> None:
+    '''
+    Steps the app's main loop for up to seconds, or until until() is true
+    '''
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        app.step_frame()
+        if until is not None and until():
+            return
@@ -0,0 +1,27 @@
+import threading
+
+from karelcraft.app_server import submit
+from conftest import run_frames, write_program
+
+
+def test_two_submissions_in_a_row(app, app_paths, capsys):
+    first = write_program(app_paths['folder'], 'submitted_first', moves=8)
+    second = write_program(app_paths['folder'], 'submitted_second', moves=2)
+    results = []
+
+    def client():
+        for program in (first, second):
+            results.append(submit(app_paths['socket'], program, ''))
+
+    thread = threading.Thread(target=client, daemon=True)
+    thread.start()
+    run_frames(app, 20, until=lambda: not thread.is_alive())
+    assert results == [True, True]
+    out = capsys.readouterr().out
+    assert 'running submitted_first.py' in out
+    assert 'running submitted_second.py' in out
+
+    run_frames(app, 10, until=lambda: app.runner is None and not app.run_code)
+    assert app.code_file == second.resolve()
+    assert app.pose().key == (2, 0)  # moved twice after the reset
+    assert app.world_stacks() == {(2, 0): 'b'}  # the first run's beeper was reset
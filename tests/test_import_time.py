@@ -0,0 +1,19 @@
+import subprocess
+import sys
+
+from conftest import REPO_PATH
+
+IMPORT_BUDGET = 1.0  # seconds; importing ursina alone takes several
+
+
+def test_karelcraft_import_is_light():
+    code = ('import sys, time\n'
+            'start = time.perf_counter()\n'
+            'import karelcraft.karelcraft\n'
+            'print(time.perf_counter() - start)\n'
+            'print(" ".join(m for m in ("ursina", "panda3d") if m in sys.modules))\n')
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPO_PATH,
+                            capture_output=True, text=True, timeout=60, check=True)
+    seconds, loaded = (result.stdout.splitlines() + [''])[:2]
+    assert loaded == ''
+    assert float(seconds) < IMPORT_BUDGET
@@ -0,0 +1,19 @@
+from karelcraft.utils.direction import Direction
+from conftest import run_frames
+
+
+def test_karel_without_a_model(app):
+    karel = app.karel
+    karel.model = None  # e.g. assets/block not found
+    try:
+        karel.tween_duration = 0.1
+        karel.reset()
+        karel.set_pose((1, 0), Direction.EAST, 0)
+        karel.move()
+        run_frames(app, 0.2)
+        assert karel.tween is None
+        assert (karel.position.x, karel.position.y) == (2, 0)
+    finally:
+        karel.tween_duration = 0
+        karel.model = 'assets/block'
+        karel.reset()
@@ -0,0 +1,24 @@
+import re
+
+from conftest import run_frames, write_program
+
+
+def profiled_run(app, program, path, sample: int) -> dict:
+    app.line_profile, app.line_profile_sample = str(path), sample
+    try:
+        app.load_program(program, '')
+        run_frames(app, 10, until=lambda: app.runner is None and not app.run_code)
+    finally:
+        app.line_profile, app.line_profile_sample = None, 1
+    return {stack: int(count) for stack, count in
+            re.findall(r'^(\S+) (\d+)$', path.read_text(), re.M)}
+
+
+def test_sampled_run_scales_its_counts(app, app_paths, tmp_path):
+    program = write_program(app_paths['folder'], 'profiled', moves=8)
+    full = profiled_run(app, program, tmp_path / 'full.folded', 1)
+    sampled = profiled_run(app, program, tmp_path / 'sampled.folded', 2)
+    # 8 front_is_clear() queries, each followed by an action, then put_beeper()
+    assert sum(full.values()) == 17
+    assert all(count % 2 == 0 for count in sampled.values())
+    assert sum(sampled.values()) == 16  # every other call, counted twice
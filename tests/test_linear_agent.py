@@ -0,0 +1,15 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from karelcraft.rl.linear_agent import PLANE_NAMES, LinearQAgent
+
+
+def test_outside_plane_marks_only_the_padding():
+    planes = np.zeros((len(PLANE_NAMES), 3, 4), dtype=np.uint8)
+    for window in (0, 1, 2):
+        agent = LinearQAgent(SimpleNamespace(actions=['move']), planes, window=window)
+        outside = agent.planes[0]
+        assert outside.shape == (3 + 2 * window, 4 + 2 * window)
+        assert not outside[window:window + 3, window:window + 4].any()
+        assert outside.sum() == outside.size - 12
@@ -0,0 +1,46 @@
+import re
+import time
+from collections import Counter
+
+from karelcraft.utils.metrics_export import MetricsExporter
+from conftest import run_frames, write_program
+
+
+def names_of(text: str) -> Counter:
+    return Counter(re.findall(r'^# TYPE (\S+)', text, re.M))
+
+
+def test_exporter_rates_and_close(tmp_path):
+    path = tmp_path / 'metrics.prom'
+    exporter = MetricsExporter(path, interval=0.05)
+    exporter.add_count('frames', 'Frames rendered')
+    exporter.start()
+    exporter.start()  # a second start is ignored
+    for _ in range(20):
+        exporter.counts['frames'] += 10
+        time.sleep(0.01)
+    exporter.close()
+    text = path.read_text()
+    assert 'karelcraft_frames_total 200' in text
+    assert set(names_of(text).values()) == {1}
+
+
+def test_app_writes_metrics_once_started(app, app_paths):
+    path = app_paths['metrics_file']
+    assert app.metrics.thread.is_alive()
+    run_frames(app, app.metrics.interval + 0.5, until=lambda: app.runner is None and not app.run_code)
+    time.sleep(app.metrics.interval + 0.2)
+    assert path.is_file()
+    text = path.read_text()
+    assert int(re.search(r'^karelcraft_frames_total (\d+)', text, re.M).group(1)) > 0
+    assert set(names_of(text).values()) == {1}
+
+
+def test_program_swaps_keep_one_sampler(app, app_paths):
+    for name in ('second_program', 'third_program'):
+        app.load_program(write_program(app_paths['folder'], name), '')
+        run_frames(app, 5, until=lambda: app.runner is None and not app.run_code)
+    time.sleep(app.metrics.interval + 0.2)
+    text = app_paths['metrics_file'].read_text()
+    assert set(names_of(text).values()) == {1}  # no metric registered twice
+    assert int(re.search(r'^karelcraft_actions_total (\d+)', text, re.M).group(1)) >= 12
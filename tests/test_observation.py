@@ -0,0 +1,13 @@
+from karelcraft.utils.direction import Direction
+from karelcraft.utils.observation import CHANNEL, ObservationPlanes
+from karelcraft.utils.world_loader import Wall
+
+
+def test_walls_are_marked_on_both_sides():
+    planes = ObservationPlanes(3, 2)
+    planes.update_walls({Wall(0, 0, Direction.EAST), Wall(2, 1, Direction.NORTH)})
+    array = planes.array
+    assert array[CHANNEL['wall_east'], 1, 0] == 1  # (0, 0) is the bottom-left cell
+    assert array[CHANNEL['wall_west'], 1, 1] == 1  # its neighbour (1, 0)
+    assert array[CHANNEL['wall_north'], 0, 2] == 1  # on the border, no neighbour
+    assert array[CHANNEL['wall_east']:CHANNEL['wall_north'] + 1].sum() == 3
@@ -0,0 +1,24 @@
+from conftest import run_frames
+
+
+def test_paint_region_draws_one_mesh(app):
+    from ursina import scene
+    world = app.world
+    app.karel.reset()
+    run_frames(app, 0.1)
+    entities = len(scene.entities)
+    cells = [(col, row) for col in range(4) for row in range(3)]
+    assert app.karel.paint_region(cells, 'red') == 12
+    run_frames(app, 0.1)
+    assert len(scene.entities) == entities + 1  # the chunk's mesh
+    assert all(world.corner_color((col, row, 0)) == 'red' for col, row in cells)
+    assert len(world.paints.chunks[(0, 0)].model.vertices) == 4 * 12
+
+    world.remove_color((0, 0, 0))
+    run_frames(app, 0.1)
+    assert world.corner_color((0, 0, 0)) is None
+    assert len(world.paints.chunks[(0, 0)].model.vertices) == 4 * 11
+    app.karel.reset()
+    run_frames(app, 0.1)
+    assert (0, 0) not in world.paints.chunks
+    assert len(scene.entities) == entities
@@ -0,0 +1,14 @@
+def test_stop_profiler_restores_entity_init(app):
+    from ursina import Entity, destroy
+    entity_init = Entity.__init__
+    app.start_profiler()
+    try:
+        profiler = app.profiler
+        destroy(Entity())
+        assert profiler.created == 1
+    finally:
+        app.stop_profiler()
+    assert app.profiler is None
+    assert Entity.__init__ is entity_init
+    destroy(Entity())
+    assert profiler.created == 1
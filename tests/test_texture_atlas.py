@@ -0,0 +1,11 @@
+from pathlib import Path
+
+import pytest
+
+
+def test_names_keep_the_hotkey_order():
+    pytest.importorskip('ursina')
+    from karelcraft.utils.texture_atlas import BLOCKS_PATH, TextureAtlas
+    # the 1-9 hotkeys pick names[key - 1], as they picked from the glob before the atlas
+    expected = [path.stem.split('_')[0] for path in Path(BLOCKS_PATH).glob('*.png')]
+    assert TextureAtlas().names == expected
@@ -0,0 +1,25 @@
+from karelcraft.utils.action_trace import TraceWriter
+from karelcraft.utils.trace_replay import TraceReplayer
+
+
+def test_replay_skips_failed_and_unknown_arguments(tmp_path):
+    path = tmp_path / 'run.trace'
+    writer = TraceWriter(path, '')
+    writer.record('move')
+    writer.record('paint_corner', ('white33',), failed=True)  # not a paintable color
+    writer.record('put_block', ('bogus',), failed=True)
+    writer.record('move')
+    # a texture the app's atlas has but TEXTURE_LIST does not, stored as UNKNOWN
+    writer.record('put_block', ('marble',))
+    writer.record('move')
+    writer.close()
+
+    replayer = TraceReplayer(path)
+    assert replayer.seek(4) == 4
+    assert replayer.model.position == (2, 0)
+    assert replayer.diverged_at is None  # failed actions changed nothing
+    assert not replayer.model.stacks.get((1, 0))
+
+    assert replayer.seek(6) == 6
+    assert replayer.model.position == (3, 0)
+    assert replayer.diverged_at == 4  # the block could not be replayed
@@ -0,0 +1,26 @@
+from karelcraft.utils.direction import Direction
+from karelcraft.utils.world_loader import Wall
+from conftest import run_frames
+
+
+def test_wall_edits_rebuild_once_per_frame(app, monkeypatch):
+    world, mesh = app.world, app.world.wall_mesh
+    rebuilds = []
+    rebuild = mesh.rebuild
+    monkeypatch.setattr(mesh, 'rebuild', lambda walls: rebuilds.append(1) or rebuild(walls))
+    walls = set(world.walls)
+    for row in range(3):
+        world.add_wall(Wall(0, row, Direction.EAST))
+    world.remove_wall(Wall(1, 0, Direction.WEST))  # the alternative of (0, 0) east
+    run_frames(app, 0.2)
+    assert len(rebuilds) == 1
+    assert world.walls == walls | {Wall(0, 1, Direction.EAST), Wall(0, 2, Direction.EAST)}
+
+    world.add_wall(Wall(0, 1, Direction.EAST))  # already there
+    world.remove_wall(Wall(0, 0, Direction.EAST))  # already gone
+    run_frames(app, 0.2)
+    assert len(rebuilds) == 1
+    for row in (1, 2):
+        world.remove_wall(Wall(0, row, Direction.EAST))
+    run_frames(app, 0.2)
+    assert len(rebuilds) == 2 and world.walls == walls